@@ -1,12 +1,31 @@
+import asyncio
+import io
 import os
+import re
+import signal
 import sqlite3
+import time
 import psutil
 from pathlib import Path
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
-from collections import deque
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
 
+import ccxt.async_support as ccxt_async
+import numpy as np
+import orjson
+import pandas as pd
+import matplotlib
+import matplotlib.pyplot as plt
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
+
+matplotlib.use("Agg")
+
 # ================== ПУТИ И ENV ==================
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -43,11 +62,33 @@ def check_env():
 
 # ================== БАЗА ДАННЫХ (SQLite) ==================
 
+_REGEXP_CACHE = {}
+
+
+def _sql_regexp(pattern, value):
+    """Реализация оператора REGEXP для SQLite: value REGEXP pattern."""
+    if value is None:
+        return 0
+    rx = _REGEXP_CACHE.get(pattern)
+    if rx is None:
+        rx = _REGEXP_CACHE[pattern] = re.compile(pattern)
+    return 1 if rx.search(value) else 0
+
+
+def connect_db():
+    """
+    Открывает соединение с botinfo.db с зарегистрированной функцией REGEXP.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    conn.create_function("REGEXP", 2, _sql_regexp, deterministic=True)
+    return conn
+
+
 def init_db():
     """
     Создаёт файл базы данных botinfo.db и таблицу trades, если её ещё нет.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     cur = conn.cursor()
 
     # Таблица сделок (аналог trades.csv, но в SQL)
@@ -84,7 +125,7 @@ def migrate_csv_to_db():
     if not csv_path.exists():
         return
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     cur = conn.cursor()
     cur.execute("SELECT COUNT(*) FROM trades;")
     existing_rows = cur.fetchone()[0]
@@ -93,7 +134,6 @@ def migrate_csv_to_db():
         return
 
     try:
-        import pandas as pd  # локальный импорт, чтобы не падать, если pandas отсутствует
         df = pd.read_csv(csv_path, engine="python", on_bad_lines="skip")
     except Exception:
         conn.close()
@@ -159,21 +199,27 @@ def load_trades_dataframe():
             ]
         )
 
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(
+    conn = connect_db()
+    rows = conn.execute(
         """
         SELECT type, symbol, price, amount, usd_value, pnl_pct, pnl_usd, time_utc
         FROM trades
-        """,
-        conn,
-        parse_dates=["time_utc"],
-    )
+        """
+    ).fetchall()
     conn.close()
 
+    df = pd.DataFrame.from_records(
+        rows,
+        columns=["type", "symbol", "price", "amount", "usd_value", "pnl_pct", "pnl_usd", "time_utc"],
+    )
     if df.empty:
         return df
 
-    df = df.rename(columns={"time_utc": "time"})
+    # Все записи — ISO 8601 (с/без микросекунд и смещения); наивные считаем UTC.
+    # cache=True переиспользует разбор повторяющихся строк.
+    df["time"] = pd.to_datetime(
+        df.pop("time_utc"), format="ISO8601", utc=True, cache=True, errors="coerce"
+    )
     return df
 
 
@@ -191,7 +237,7 @@ def log_trade_sql(
     Ты потом сможешь вызывать её из своего торгового кода
     вместо/вместе с log_trade в CSV.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     cur = conn.cursor()
 
     time_utc = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
@@ -209,37 +255,12 @@ def log_trade_sql(
 
 
 # ================== МЕСТО ДЛЯ ТВОЕГО БОТА ==================
-import asyncio
-import json
-import os
-import time
-from datetime import datetime, timedelta
-import signal
-import io
 
-import ccxt
-import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
-
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
-from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
-from dotenv import load_dotenv
-
-matplotlib.use("Agg")
-
-# ================== ENV ==================
-load_dotenv()
-
-API_KEY = os.getenv("API_KEY")
-SECRET = os.getenv("SECRET")
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-chat_id_env = os.getenv("TELEGRAM_CHAT_ID")
-
-if not chat_id_env:
+# ENV уже прочитан в начале файла; chat id нужен числом
+if not TELEGRAM_CHAT_ID:
     raise RuntimeError("TELEGRAM_CHAT_ID не задан. Проверь .env или переменные окружения.")
 
-TELEGRAM_CHAT_ID = int(chat_id_env)
+TELEGRAM_CHAT_ID = int(TELEGRAM_CHAT_ID)
 
 # ================== CONFIG ==================
 STRATEGY_CONFIG = {
@@ -279,10 +300,17 @@ COINS = {
     "SOL": "SOL/USDT",
     "XRP": "XRP/USDT",
 }
-SYMBOLS = list(COINS.values())
+# COINS не меняется после старта — кортежи вместо dict-view в каждом цикле
+COIN_ITEMS = tuple(COINS.items())
+SYMBOLS = tuple(COINS.values())
+SYMBOL_IDX = {sym: i for i, sym in enumerate(SYMBOLS)}
 DEFAULT_SYMBOL = COINS["BTC"]
 
 PAIR_URL_TEMPLATE = "https://bingx.com/en/spot/{pair}"
+PAIR_LINKS = {
+    sym: f'<a href="{PAIR_URL_TEMPLATE.format(pair=sym.replace("/", ""))}">{sym}</a>'
+    for sym in SYMBOLS
+}
 
 SELL_KEYWORDS = [
     "SELL",
@@ -295,6 +323,9 @@ SELL_KEYWORDS = [
     "AUTO_SELL",
 ]
 SELL_PATTERN = "|".join(SELL_KEYWORDS)
+BUY_RE = re.compile("BUY")
+SELL_RE = re.compile(SELL_PATTERN)
+_REGEXP_CACHE[SELL_PATTERN] = SELL_RE
 
 # ================== АДАПТИВНАЯ СТРАТЕГИЯ ПО МОНЕТАМ ==================
 # Автоадаптация “мягкости/жесткости” условий по каждой монете отдельно.
@@ -451,24 +482,72 @@ def get_symbol_config(symbol: str) -> dict:
     return base
 
 # ================== STATE ==================
-positions = {
-    sym: {
-        "in_position": False, 
-        "entry_price": 0.0, 
-        "amount": 0.0, 
-        "buy_time": None,
-        "max_price": 0.0,      # Для trailing stop
-        "trailing_stop": 0.0,  # Уровень trailing stop
-    }
-    for sym in SYMBOLS
+# Числовые поля позиций одним буфером (SoA): строка — SYMBOL_IDX[sym]
+POS_IN, POS_ENTRY, POS_AMOUNT, POS_MAX, POS_TRAIL = range(5)
+_POS_COLS = {
+    "in_position": POS_IN,
+    "entry_price": POS_ENTRY,
+    "amount": POS_AMOUNT,
+    "max_price": POS_MAX,        # Для trailing stop
+    "trailing_stop": POS_TRAIL,  # Уровень trailing stop
 }
+pos_arr = np.zeros((len(SYMBOLS), len(_POS_COLS)), dtype=np.float64)
+
+
+class PositionView:
+    """
+    Позиция монеты как dict-подобная запись поверх строки pos_arr:
+    pos["entry_price"] читает и пишет массив, buy_time хранится в объекте.
+    """
+
+    __slots__ = ("_i", "buy_time")
+
+    def __init__(self, i):
+        self._i = i
+        self.buy_time = None
+
+    def __getitem__(self, key):
+        if key == "buy_time":
+            return self.buy_time
+        value = pos_arr[self._i, _POS_COLS[key]]
+        return bool(value) if key == "in_position" else float(value)
+
+    def __setitem__(self, key, value):
+        if key == "buy_time":
+            self.buy_time = value
+        else:
+            pos_arr[self._i, _POS_COLS[key]] = value
+
+    def get(self, key, default=None):
+        if key == "buy_time" or key in _POS_COLS:
+            return self[key]
+        return default
+
+    def update(self, data):
+        for key, value in data.items():
+            self[key] = value
+
+    def reset(self):
+        pos_arr[self._i] = 0.0
+        self.buy_time = None
+
+    def to_dict(self):
+        d = {key: self[key] for key in _POS_COLS}
+        d["buy_time"] = self.buy_time
+        return d
+
+
+positions = {sym: PositionView(SYMBOL_IDX[sym]) for sym in SYMBOLS}
+
+# Цены по монетам одним буфером: строка — SYMBOL_IDX[sym], столбцы ниже
+PRICE_LAST, PRICE_DAY_OPEN, PRICE_CURRENT = 0, 1, 2
+prices = np.zeros((len(SYMBOLS), 3), dtype=np.float64)
 
-last_price = {sym: 0.0 for sym in SYMBOLS}
 price_initialized = {sym: False for sym in SYMBOLS}
 last_trade_time = {sym: 0 for sym in SYMBOLS}
 
-day_open_price = {sym: 0.0 for sym in SYMBOLS}
-day_open_msk_date = {sym: "" for sym in SYMBOLS}
+# Номер дня МСК (сутки от эпохи), за который зафиксирована цена открытия
+day_open_msk_date = {sym: -1 for sym in SYMBOLS}
 
 ACTIVE_COINS = {sym: True for sym in SYMBOLS}
 
@@ -479,10 +558,36 @@ TRADE_DEPOSITS = {
     COINS["XRP"]: 10.0,
 }
 
-current_prices = {sym: 0.0 for sym in SYMBOLS}
 last_price_update_time = 0
 
-manual_seen_trade_ids = set()
+class LRUSet:
+    """Множество с ограничением размера: при переполнении вытесняются самые старые ключи."""
+
+    def __init__(self, maxlen, items=()):
+        self.maxlen = maxlen
+        self._d = OrderedDict()
+        for k in items:
+            self.add(k)
+
+    def add(self, key):
+        self._d[key] = None
+        self._d.move_to_end(key)
+        if len(self._d) > self.maxlen:
+            self._d.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._d
+
+    def __iter__(self):
+        return iter(self._d)
+
+    def __len__(self):
+        return len(self._d)
+
+
+# fetch_my_trades отдаёт 20 последних сделок на монету — 10k с большим запасом
+MANUAL_SEEN_MAX = 10_000
+manual_seen_trade_ids = LRUSet(MANUAL_SEEN_MAX)
 
 running = True
 
@@ -496,25 +601,148 @@ def is_authorized_user(update: Update) -> bool:
     return user_id == TELEGRAM_CHAT_ID if user_id else False
 
 
-def get_exchange():
-    ex = ccxt.bingx(
-        {
-            "apiKey": API_KEY,
-            "secret": SECRET,
-            "enableRateLimit": True,
-            "options": {"defaultType": "spot"},
-        }
-    )
-    ex.load_markets()
-    return ex
+# Кэш баланса: несколько обработчиков подряд делят один REST-запрос
+BALANCE_CACHE_TTL_SEC = 5.0
+_BALANCE_CACHE = {"ts": 0.0, "data": None}
+_BALANCE_LOCK = asyncio.Lock()
+
+
+async def fetch_balance_cached(ttl=BALANCE_CACHE_TTL_SEC, force=False):
+    """
+    fetch_balance с коротким TTL через общий async-клиент.
+    force=True — всегда свежий запрос (перед продажей).
+    Под локом: одновременные вызовы ждут один запрос, а не шлют свои.
+    """
+    async with _BALANCE_LOCK:
+        now = time.monotonic()
+        if (
+            not force
+            and _BALANCE_CACHE["data"] is not None
+            and now - _BALANCE_CACHE["ts"] < ttl
+        ):
+            return _BALANCE_CACHE["data"]
+        aex = await get_async_exchange()
+        data = await ex_call(aex.fetch_balance)
+        _BALANCE_CACHE["ts"] = time.monotonic()
+        _BALANCE_CACHE["data"] = data
+        return data
+
+
+# Снимок тикеров всех монет: один fetch_tickers на цикл вместо N fetch_ticker
+TICKER_CACHE_TTL_SEC = 10.0
+_TICKER_CACHE = {"ts": 0.0, "data": {}}
+_TICKER_LOCK = asyncio.Lock()
+
+
+async def fetch_tickers_cached(ttl=TICKER_CACHE_TTL_SEC, force=False):
+    """
+    Тикеры по SYMBOLS одним запросом (если биржа умеет fetchTickers),
+    иначе — параллельные fetch_ticker. Потребители в пределах TTL делят снимок.
+    """
+    async with _TICKER_LOCK:
+        now = time.monotonic()
+        if not force and _TICKER_CACHE["data"] and now - _TICKER_CACHE["ts"] < ttl:
+            return _TICKER_CACHE["data"]
+        aex = await get_async_exchange()
+        if aex.has.get("fetchTickers"):
+            data = await ex_call(aex.fetch_tickers, list(SYMBOLS))
+        else:
+            results = await asyncio.gather(
+                *(ex_call(aex.fetch_ticker, sym) for sym in SYMBOLS),
+                return_exceptions=True,
+            )
+            data = {
+                sym: t for sym, t in zip(SYMBOLS, results) if not isinstance(t, Exception)
+            }
+        _TICKER_CACHE["ts"] = time.monotonic()
+        _TICKER_CACHE["data"] = data
+        return data
+
+
+# Цена для UI и ручных действий: снимок не старше нескольких секунд
+LAST_PRICE_TTL_SEC = 3.0
+
+
+async def cached_last(symbol, ttl=LAST_PRICE_TTL_SEC) -> float:
+    """Последняя цена монеты из общего снимка тикеров (обновляется по TTL)."""
+    tickers = await fetch_tickers_cached(ttl=ttl)
+    return float(tickers[symbol]["last"])
+
+
+def invalidate_balance_cache():
+    """Сбрасывает кэш баланса — вызывать после любого ордера."""
+    _BALANCE_CACHE["data"] = None
+
+
+# Общий async-клиент: один пул соединений aiohttp на весь процесс
+_AEX = None
+
+
+async def get_async_exchange():
+    global _AEX
+    if _AEX is None:
+        _AEX = ccxt_async.bingx(
+            {
+                "apiKey": API_KEY,
+                "secret": SECRET,
+                "enableRateLimit": True,
+                "options": {"defaultType": "spot"},
+            }
+        )
+    # load_markets кэшируется внутри ccxt, повторный вызов бесплатный
+    await _AEX.load_markets()
+    return _AEX
+
+
+# Не больше N одновременных запросов к бирже, даже при asyncio.gather по всем монетам
+EXCHANGE_MAX_CONCURRENCY = 4
+_EXCHANGE_SEM = asyncio.Semaphore(EXCHANGE_MAX_CONCURRENCY)
+
+
+# Минимальный интервал между стартами запросов одного эндпоинта (сек).
+# Семафор ограничивает параллелизм, а интервал — частоту, иначе gather
+# по всем монетам выстреливает пачкой и упирается в лимиты биржи.
+ENDPOINT_MIN_SPACING_SEC = {
+    "create_market_buy_order": 0.2,
+    "create_market_sell_order": 0.2,
+    "fetch_my_trades": 0.2,
+}
+DEFAULT_MIN_SPACING_SEC = 0.1
+_ENDPOINT_NEXT_TS = {}
+
+
+async def ex_call(fn, *args, **kwargs):
+    """Вызов async-метода ccxt с интервалом по эндпоинту и под общим семафором."""
+    endpoint = getattr(fn, "__name__", "")
+    spacing = ENDPOINT_MIN_SPACING_SEC.get(endpoint, DEFAULT_MIN_SPACING_SEC)
+    now = time.monotonic()
+    # Слот бронируется сразу, поэтому одновременные вызовы выстраиваются в очередь
+    start = max(now, _ENDPOINT_NEXT_TS.get(endpoint, 0.0))
+    _ENDPOINT_NEXT_TS[endpoint] = start + spacing
+    if start > now:
+        await asyncio.sleep(start - now)
+    async with _EXCHANGE_SEM:
+        return await fn(*args, **kwargs)
+
+
+async def close_async_exchange():
+    global _AEX
+    if _AEX is not None:
+        try:
+            await _AEX.close()
+        except Exception as e:
+            print(f"Ошибка закрытия async-клиента: {e}")
+        _AEX = None
+
+
+STATE_PATH = "state.json"
 
 
 def save_state():
     state = {
-        "positions": positions,
-        "last_price": last_price,
+        "positions": {sym: pos.to_dict() for sym, pos in positions.items()},
+        "prices": dict(zip(SYMBOLS, prices.tolist())),
         "strategy_config": STRATEGY_CONFIG,
-        "day_open_price": day_open_price,
         "day_open_msk_date": day_open_msk_date,
         "active_coins": ACTIVE_COINS,
         "trade_deposits": TRADE_DEPOSITS,
@@ -530,39 +758,102 @@ def save_state():
         },
         "global_start_mode": GLOBAL_START_MODE,
     }
-    with open("state.json", "w") as f:
-        json.dump(state, f)
+    # Пишем во временный файл и атомарно подменяем: state.json не бывает обрезанным
+    data = orjson.dumps(state, option=orjson.OPT_SERIALIZE_NUMPY)
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, STATE_PATH)
+
+
+# Изменения состояния только помечают его грязным; на диск пишет
+# _state_flusher не чаще раза в STATE_FLUSH_INTERVAL_SEC
+STATE_FLUSH_INTERVAL_SEC = 1.0
+_state_dirty = False
+
+
+def mark_state_dirty():
+    global _state_dirty
+    _state_dirty = True
+
+
+def flush_state():
+    """Синхронная запись, если есть несохранённые изменения (флашер, остановка)."""
+    global _state_dirty
+    if _state_dirty:
+        save_state()
+        # Флаг снимаем только после успешной записи — иначе флашер повторит
+        _state_dirty = False
+
+
+async def _state_flusher():
+    while running:
+        try:
+            flush_state()
+        except Exception as e:
+            print(f"Ошибка сохранения state.json: {e}")
+        await asyncio.sleep(STATE_FLUSH_INTERVAL_SEC)
+
+
+def msk_day_bucket(ts) -> int:
+    """Номер суток по МСК для unix-времени ts."""
+    return (int(ts) + MOSCOW_OFFSET_HOURS * 3600) // 86400
+
+
+def msk_day_str(bucket) -> str:
+    """Дата дня МСК для логов."""
+    return datetime.fromtimestamp(bucket * 86400, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _parse_msk_day(value) -> int:
+    """День МСК из state.json: int или строка 'YYYY-MM-DD' из старого формата."""
+    if isinstance(value, int):
+        return value
+    try:
+        d = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return -1
+    return int(d.timestamp()) // 86400
 
 
 def load_state():
-    global positions, last_price, STRATEGY_CONFIG
-    global day_open_price, day_open_msk_date, ACTIVE_COINS, TRADE_DEPOSITS
+    global positions, STRATEGY_CONFIG
+    global day_open_msk_date, ACTIVE_COINS, TRADE_DEPOSITS
     global manual_seen_trade_ids, ADAPTIVE_STATE, GLOBAL_START_MODE
 
-    if os.path.exists("state.json"):
+    if os.path.exists(STATE_PATH):
         try:
-            with open("state.json") as f:
-                state = json.load(f)
+            with open(STATE_PATH, "rb") as f:
+                state = orjson.loads(f.read())
 
             if isinstance(state, dict) and "positions" in state:
                 saved_positions = state.get("positions", {})
                 for sym in SYMBOLS:
                     if sym in saved_positions:
                         pos_data = saved_positions[sym]
-                        positions[sym] = {
+                        positions[sym].update({
                             "in_position": pos_data.get("in_position", False),
                             "entry_price": pos_data.get("entry_price", 0.0),
                             "amount": pos_data.get("amount", 0.0),
                             "buy_time": pos_data.get("buy_time"),
                             "max_price": pos_data.get("max_price", pos_data.get("entry_price", 0.0)),
                             "trailing_stop": pos_data.get("trailing_stop", 0.0),
-                        }
+                        })
 
-                saved_last_price = state.get("last_price", {})
-                if isinstance(saved_last_price, dict):
+                saved_prices = state.get("prices")
+                if isinstance(saved_prices, dict):
                     for sym in SYMBOLS:
-                        if sym in saved_last_price:
-                            last_price[sym] = saved_last_price[sym]
+                        row = saved_prices.get(sym)
+                        if isinstance(row, list) and len(row) == prices.shape[1]:
+                            prices[SYMBOL_IDX[sym]] = row
+                else:
+                    # Старый формат: отдельные словари last_price / day_open_price
+                    for key, col in (("last_price", PRICE_LAST), ("day_open_price", PRICE_DAY_OPEN)):
+                        saved = state.get(key, {})
+                        if isinstance(saved, dict):
+                            for sym in SYMBOLS:
+                                if saved.get(sym):
+                                    prices[SYMBOL_IDX[sym], col] = saved[sym]
 
                 if "strategy_config" in state:
                     saved_config = state["strategy_config"]
@@ -570,17 +861,13 @@ def load_state():
                         if key in STRATEGY_CONFIG:
                             STRATEGY_CONFIG[key] = saved_config[key]
 
-                saved_day_open_price = state.get("day_open_price", {})
-                if isinstance(saved_day_open_price, dict):
-                    for sym in SYMBOLS:
-                        if sym in saved_day_open_price:
-                            day_open_price[sym] = saved_day_open_price[sym]
-
                 saved_day_open_msk_date = state.get("day_open_msk_date", {})
                 if isinstance(saved_day_open_msk_date, dict):
                     for sym in SYMBOLS:
                         if sym in saved_day_open_msk_date:
-                            day_open_msk_date[sym] = saved_day_open_msk_date[sym]
+                            day_open_msk_date[sym] = _parse_msk_day(
+                                saved_day_open_msk_date[sym]
+                            )
 
                 saved_active = state.get("active_coins", {})
                 if isinstance(saved_active, dict):
@@ -596,7 +883,7 @@ def load_state():
 
                 saved_manual_ids = state.get("manual_seen_trade_ids", [])
                 if isinstance(saved_manual_ids, list):
-                    manual_seen_trade_ids = set(saved_manual_ids)
+                    manual_seen_trade_ids = LRUSet(MANUAL_SEEN_MAX, saved_manual_ids)
 
                 saved_adapt = state.get("adaptive_state", {})
                 if isinstance(saved_adapt, dict):
@@ -614,15 +901,9 @@ def load_state():
                 GLOBAL_START_MODE = state.get("global_start_mode", "normal")
 
         except Exception:
-            positions.clear()
-            for sym in SYMBOLS:
-                positions[sym] = {
-                    "in_position": False,
-                    "entry_price": 0.0,
-                    "amount": 0.0,
-                    "buy_time": None,
-                }
-                last_price[sym] = 0.0
+            for pos in positions.values():
+                pos.reset()
+            prices[:, PRICE_LAST] = 0.0
 
 
 def log_trade(trade_data):
@@ -630,7 +911,7 @@ def log_trade(trade_data):
     Запись сделки в SQLite и фиксация результата для адаптации.
     Ожидает словарь с ключами type, symbol, price, amount, usd_value и опционально pnl_pct, pnl_usd.
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     cur = conn.cursor()
 
     cur.execute(
@@ -652,43 +933,203 @@ def log_trade(trade_data):
 
     conn.commit()
     conn.close()
+    _pnl_today_cached.cache_clear()
 
 
-def calculate_indicators(ohlcv):
-    df = pd.DataFrame(
-        ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
-    )
-    df["close"] = df["close"].astype(float)
-    df["volume"] = df["volume"].astype(float)
-    df["ema9"] = df["close"].ewm(span=9, adjust=False).mean()
-    df["ema21"] = df["close"].ewm(span=21, adjust=False).mean()
-
-    delta = df["close"].diff()
-    gain = delta.where(delta > 0, 0)
-    loss = -delta.where(delta < 0, 0)
-    avg_gain = gain.rolling(14).mean()
-    avg_loss = loss.rolling(14).mean()
-    rs = avg_gain / avg_loss
-    df["rsi"] = 100 - (100 / (1 + rs))
-    df["avg_volume"] = df["volume"].rolling(20).mean()
-    return df.iloc[-1], df
-
-
-def calculate_atr(df, period=14):
-    high = df["high"].values
-    low = df["low"].values
-    close = df["close"].values
-    tr_list = []
-    for i in range(1, len(high)):
-        tr = max(
-            high[i] - low[i],
-            abs(high[i] - close[i - 1]),
-            abs(low[i] - close[i - 1]),
+ALPHA_EMA9 = 2.0 / (9 + 1)
+ALPHA_EMA21 = 2.0 / (21 + 1)
+
+
+@lru_cache(maxsize=32)
+def _ema_weights(span, n, adjust):
+    """
+    Веса свёртки EMA для окна длины n. Окна фиксированные (50/200 на 1440,
+    9/21 на окне цикла), поэтому степени считаются один раз на (span, n).
+    """
+    alpha = 2.0 / (span + 1)
+    weights = (1 - alpha) ** np.arange(n - 1, -1, -1, dtype=np.float64)
+    if adjust:
+        weights /= weights.sum()
+    else:
+        weights[1:] *= alpha
+    weights.flags.writeable = False
+    return weights
+
+
+def _ema_last(values, span, adjust=False):
+    """Последнее значение EMA (как ewm(span, adjust=...)) одной свёрткой."""
+    return float(_ema_weights(span, len(values), adjust) @ values)
+
+
+# (span, длина окна, adjust) всех фиксированных окон бота:
+# засев EMA_STATE, 15м-фильтры и /market на суточных свечах
+_EMA_WARM_WINDOWS = (
+    (9, 49, False), (21, 49, False),      # засев по 50 свечам без текущей
+    (20, 50, False), (50, 50, False),     # тренд BTC, 15м
+    (9, 30, False), (21, 30, False),      # подтверждение старшего ТФ
+    (50, 1440, True), (200, 1440, True),  # /market
+)
+
+
+def prewarm_indicator_caches():
+    """Считает веса EMA заранее, чтобы первый цикл и первый /market не платили за это."""
+    for span, n, adjust in _EMA_WARM_WINDOWS:
+        _ema_weights(span, n, adjust)
+
+
+def _rsi_last(close, period=14):
+    """RSI на последней свече: скользящие средние приростов/падений за period."""
+    if len(close) < period:
+        return float("nan")
+    delta = np.diff(close[-(period + 1):])
+    avg_gain = delta[delta > 0].sum() / period
+    avg_loss = -delta[delta < 0].sum() / period
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else float("nan")
+    return float(100 - 100 / (1 + avg_gain / avg_loss))
+
+
+# Инкрементальное состояние EMA по закрытым свечам: ts — время последней учтённой
+EMA_STATE = {sym: {"ts": None, "ema9": None, "ema21": None} for sym in SYMBOLS}
+OHLCV_WARM_LIMIT = 21        # хватает на avg_volume(20) и RSI(14)
+OHLCV_WARM_MAX_AGE_MS = 15 * 60 * 1000
+
+
+def ohlcv_fetch_limit(symbol, now_ms) -> int:
+    """Сколько минутных свечей запрашивать: полное окно только для прогрева EMA."""
+    st_ts = EMA_STATE.get(symbol, {}).get("ts")
+    if st_ts is not None and now_ms - st_ts < OHLCV_WARM_MAX_AGE_MS:
+        return OHLCV_WARM_LIMIT
+    return 50
+
+
+def _update_ema_state(symbol, ts, close):
+    """
+    Досчитывает EMA9/EMA21 по новым закрытым свечам (все, кроме последней).
+    Если состояние пустое или устарело — засевается по всему окну.
+    """
+    st = EMA_STATE[symbol]
+    closed_ts = ts[:-1]
+    closed = close[:-1]
+    if st["ts"] is None or st["ts"] < closed_ts[0] or st["ts"] > closed_ts[-1]:
+        st["ema9"] = _ema_last(closed, 9)
+        st["ema21"] = _ema_last(closed, 21)
+    else:
+        for c in closed[closed_ts > st["ts"]].tolist():
+            st["ema9"] = ALPHA_EMA9 * c + (1 - ALPHA_EMA9) * st["ema9"]
+            st["ema21"] = ALPHA_EMA21 * c + (1 - ALPHA_EMA21) * st["ema21"]
+    st["ts"] = float(closed_ts[-1])
+    return st
+
+
+def calculate_indicators_np(ohlcv, symbol=None) -> dict:
+    """
+    Значения индикаторов только для последней свечи, без DataFrame.
+    Ключи: open, close, volume, prev_close, ema9, ema21, rsi, avg_volume.
+    С symbol EMA считается инкрементально через EMA_STATE: O(1) на тик.
+    """
+    arr = np.asarray(ohlcv, dtype=np.float64)
+    close = arr[:, 4]
+    volume = arr[:, 5]
+    if symbol in EMA_STATE:
+        st = _update_ema_state(symbol, arr[:, 0], close)
+        ema9 = ALPHA_EMA9 * close[-1] + (1 - ALPHA_EMA9) * st["ema9"]
+        ema21 = ALPHA_EMA21 * close[-1] + (1 - ALPHA_EMA21) * st["ema21"]
+    else:
+        ema9 = _ema_last(close, 9)
+        ema21 = _ema_last(close, 21)
+    return {
+        "open": float(arr[-1, 1]),
+        "close": float(close[-1]),
+        "volume": float(volume[-1]),
+        "prev_close": float(close[-2]),
+        "ema9": float(ema9),
+        "ema21": float(ema21),
+        "rsi": _rsi_last(close),
+        "avg_volume": float(volume[-20:].mean()) if len(volume) >= 20 else float("nan"),
+    }
+
+
+_IND_KEYS = ("open", "close", "volume", "prev_close", "ema9", "ema21", "rsi", "avg_volume")
+
+
+def calculate_indicators_batch(ohlcv_map) -> dict:
+    """
+    calculate_indicators_np для всех монет цикла: EMA_STATE досчитывается
+    по каждой монете, а живые EMA, RSI и avg_volume — одним проходом numpy
+    по стопке хвостов (монеты × OHLCV_WARM_LIMIT свечей).
+    """
+    result = {}
+    tails, prev9, prev21 = [], [], []
+    for symbol, ohlcv in ohlcv_map.items():
+        arr = np.asarray(ohlcv, dtype=np.float64)
+        if len(arr) < OHLCV_WARM_LIMIT:
+            result[symbol] = calculate_indicators_np(arr, symbol)
+            continue
+        st = _update_ema_state(symbol, arr[:, 0], arr[:, 4])
+        tails.append((symbol, arr[-OHLCV_WARM_LIMIT:]))
+        prev9.append(st["ema9"])
+        prev21.append(st["ema21"])
+    if not tails:
+        return result
+
+    win = np.stack([t for _, t in tails])
+    close = win[:, :, 4]
+    volume = win[:, :, 5]
+    last_close = close[:, -1]
+    ema9 = ALPHA_EMA9 * last_close + (1 - ALPHA_EMA9) * np.array(prev9)
+    ema21 = ALPHA_EMA21 * last_close + (1 - ALPHA_EMA21) * np.array(prev21)
+
+    # RSI как в _rsi_last: avg_loss == 0 даёт 100 (или NaN при нуле приростов)
+    delta = np.diff(close[:, -15:], axis=1)
+    avg_gain = np.where(delta > 0, delta, 0.0).sum(axis=1) / 14
+    avg_loss = np.where(delta < 0, -delta, 0.0).sum(axis=1) / 14
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+
+    rows = np.column_stack(
+        (
+            win[:, -1, 1], last_close, volume[:, -1], close[:, -2],
+            ema9, ema21, rsi, volume[:, -20:].mean(axis=1),
         )
-        tr_list.append(tr)
-    if len(tr_list) >= period:
-        return sum(tr_list[-period:]) / period
-    return 0
+    ).tolist()
+    for (symbol, _), row in zip(tails, rows):
+        result[symbol] = dict(zip(_IND_KEYS, row))
+    return result
+
+
+def signal_candidates(indicators) -> set:
+    """
+    Монеты, по которым generate_signal вообще может дать сигнал.
+    Необходимое условие считается маской numpy сразу по всем монетам:
+    позиция открыта (проверки продажи и trailing), RSI в зоне level_buy
+    (35..55) либо свеча зелёная. Зелёная свеча нужна и basic_buy, и fib_buy,
+    а fib_buy без рыночного контекста (24ч-свечи) точнее не сузить — поэтому
+    отдельная маска basic_buy ничего бы не отсеяла. Остальные монеты
+    не тратят запросы BTC-тренда и 24ч-свечей.
+    """
+    syms = list(indicators)
+    if not syms:
+        return set()
+    v = np.array([[indicators[s][k] for k in _IND_KEYS] for s in syms])
+    open_, close, volume, prev_close, ema9, ema21, rsi, avg_volume = v.T
+    in_pos = pos_arr[[SYMBOL_IDX[s] for s in syms], POS_IN] > 0
+
+    green = close > open_
+    level_mask = (rsi > 35) & (rsi < 55)
+    mask = in_pos | level_mask | green
+    return {syms[j] for j in np.flatnonzero(mask)}
+
+
+def calculate_atr_np(high, low, close, period=14):
+    """ATR по последним period true range — только хвост окна, без цикла."""
+    if len(high) <= period:
+        return 0
+    h = high[-period:]
+    l = low[-period:]
+    pc = close[-period - 1:-1]
+    tr = np.maximum(h - l, np.maximum(np.abs(h - pc), np.abs(l - pc)))
+    return float(tr.mean())
 
 
 def is_trading_hours_active(cfg) -> bool:
@@ -706,28 +1147,26 @@ def is_trading_hours_active(cfg) -> bool:
     return start <= current_hour < end
 
 
-def get_btc_trend(ex) -> str:
+async def get_btc_trend(ex) -> str:
     """
     Определяет тренд BTC на 15-минутном ТФ.
     Возвращает: 'UP', 'DOWN', 'SIDEWAYS'
     """
     try:
-        ohlcv = ex.fetch_ohlcv("BTC/USDT", "15m", limit=50)
-        df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"])
-        df["close"] = df["close"].astype(float)
-        
+        ohlcv = await ex_call(ex.fetch_ohlcv, "BTC/USDT", "15m", limit=50)
+        close = np.asarray(ohlcv, dtype=np.float64)[:, 4]
+
         # EMA 20 и 50 на 15м
-        df["ema20"] = df["close"].ewm(span=20, adjust=False).mean()
-        df["ema50"] = df["close"].ewm(span=50, adjust=False).mean()
-        
-        last = df.iloc[-1]
-        prev = df.iloc[-3]  # 3 свечи назад
-        
+        ema20 = _ema_last(close, 20)
+        ema50 = _ema_last(close, 50)
+        last_close = close[-1]
+        prev_close = close[-3]  # 3 свечи назад
+
         # Тренд UP если EMA20 > EMA50 и цена растёт
-        if last["ema20"] > last["ema50"] and last["close"] > prev["close"]:
+        if ema20 > ema50 and last_close > prev_close:
             return "UP"
         # Тренд DOWN если EMA20 < EMA50 и цена падает
-        elif last["ema20"] < last["ema50"] and last["close"] < prev["close"]:
+        elif ema20 < ema50 and last_close < prev_close:
             return "DOWN"
         else:
             return "SIDEWAYS"
@@ -736,23 +1175,20 @@ def get_btc_trend(ex) -> str:
         return "SIDEWAYS"
 
 
-def get_higher_timeframe_confirmation(symbol, ex) -> bool:
+async def get_higher_timeframe_confirmation(symbol, ex) -> bool:
     """
     Проверяет подтверждение тренда на 15-минутном ТФ.
     Возвращает True если тренд бычий.
     """
     try:
-        ohlcv = ex.fetch_ohlcv(symbol, "15m", limit=30)
-        df = pd.DataFrame(ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"])
-        df["close"] = df["close"].astype(float)
-        
-        df["ema9"] = df["close"].ewm(span=9, adjust=False).mean()
-        df["ema21"] = df["close"].ewm(span=21, adjust=False).mean()
-        
-        last = df.iloc[-1]
-        
+        ohlcv = await ex_call(ex.fetch_ohlcv, symbol, "15m", limit=30)
+        close = np.asarray(ohlcv, dtype=np.float64)[:, 4]
+
+        ema9 = _ema_last(close, 9)
+        ema21 = _ema_last(close, 21)
+
         # Бычий тренд на старшем ТФ
-        return last["ema9"] > last["ema21"] and last["close"] > last["ema9"]
+        return ema9 > ema21 and close[-1] > ema9
     except Exception as e:
         print(f"Higher TF check error ({symbol}): {e}")
         return False
@@ -760,7 +1196,7 @@ def get_higher_timeframe_confirmation(symbol, ex) -> bool:
 
 def count_open_positions() -> int:
     """Считает количество открытых позиций"""
-    return sum(1 for sym in SYMBOLS if positions[sym]["in_position"])
+    return int(np.count_nonzero(pos_arr[:, POS_IN]))
 
 
 def update_trailing_stop(symbol, current_price, cfg):
@@ -781,7 +1217,7 @@ def update_trailing_stop(symbol, current_price, cfg):
         pos["max_price"] = current_price
         # Trailing stop = max_price * (1 - trailing_pct)
         pos["trailing_stop"] = pos["max_price"] * (1 - cfg.get("trailing_stop_pct", 0.012))
-        save_state()
+        mark_state_dirty()
 
 
 def check_trailing_stop_hit(symbol, current_price, cfg) -> bool:
@@ -807,23 +1243,18 @@ def check_trailing_stop_hit(symbol, current_price, cfg) -> bool:
     return False
 
 
-def get_market_context(symbol, current_close, cfg, ex):
+async def get_market_context(symbol, current_close, cfg, ex):
     try:
-        ohlcv_24h = ex.fetch_ohlcv(symbol, "1m", limit=1440)
-        df_24h = pd.DataFrame(
-            ohlcv_24h, columns=["timestamp", "open", "high", "low", "close", "volume"]
-        )
-        df_24h["high"] = df_24h["high"].astype(float)
-        df_24h["low"] = df_24h["low"].astype(float)
-        df_24h["close"] = df_24h["close"].astype(float)
-        df_24h["volume"] = df_24h["volume"].astype(float)
-
-        resistance = df_24h["high"].max()
-        support = df_24h["low"].min()
-        atr_14 = calculate_atr(df_24h, 14)
-        
+        ohlcv_24h = await ex_call(ex.fetch_ohlcv, symbol, "1m", limit=1440)
+        arr = np.asarray(ohlcv_24h, dtype=np.float64)
+        high, low, close, volume = arr[:, 2], arr[:, 3], arr[:, 4], arr[:, 5]
+
+        resistance = float(high.max())
+        support = float(low.min())
+        atr_14 = calculate_atr_np(high, low, close, 14)
+
         # Проверка дневного объёма
-        daily_volume_usd = (df_24h["close"] * df_24h["volume"]).sum()
+        daily_volume_usd = float(close @ volume)
         min_volume = cfg.get("min_daily_volume_usd", 1000000)
         
         if daily_volume_usd < min_volume:
@@ -868,67 +1299,20 @@ def get_market_context(symbol, current_close, cfg, ex):
         return None
 
 
-def get_pnl_today():
-    df = load_trades_dataframe()
-    if df.empty:
-        return 0.0, 0.0
-
-    try:
-        if "pnl_pct" not in df.columns:
-            df["pnl_pct"] = 0.0
-        if "pnl_usd" not in df.columns:
-            df["pnl_usd"] = 0.0
-
-        df["time"] = pd.to_datetime(df["time"], errors="coerce")
-        df = df.dropna(subset=["time"])
-
-        now_utc = datetime.now(timezone.utc)
-        now_msk = now_utc + timedelta(hours=MOSCOW_OFFSET_HOURS)
-
-        today_msk_start = now_msk.replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        tomorrow_msk_start = today_msk_start + timedelta(days=1)
-
-        today_utc_start = today_msk_start - timedelta(hours=MOSCOW_OFFSET_HOURS)
-        tomorrow_utc_start = tomorrow_msk_start - timedelta(
-            hours=MOSCOW_OFFSET_HOURS
-        )
-
-        today = df[
-            (df["time"] >= today_utc_start) & (df["time"] < tomorrow_utc_start)
-        ]
-
-        sells = today[today["type"].str.contains(SELL_PATTERN, na=False)]
-
-        total_pnl_pct = sells["pnl_pct"].sum() if not sells.empty else 0.0
-        total_usd = sells["pnl_usd"].sum() if not sells.empty else 0.0
-
-        return total_pnl_pct, total_usd
-
-    except Exception as e:
-        print(f"P&L Error: {e}")
-        return 0.0, 0.0
+def get_pnl_today_per_symbol():
+    """
+    P&L за текущие сутки (МСК): (per_symbol, total_pct, total_usd).
+    Результат кэшируется на 5 секунд — UI не нужна большая свежесть.
+    """
+    return _pnl_today_cached(int(time.time() // 5))
 
 
-def get_pnl_today_per_symbol():
-    df = load_trades_dataframe()
-    if df.empty:
+@lru_cache(maxsize=1)
+def _pnl_today_cached(bucket: int):
+    if not DB_PATH.exists():
         return {}, 0.0, 0.0
 
     try:
-        required_cols = {"time", "type", "symbol"}
-        if not required_cols.issubset(df.columns):
-            return {}, 0.0, 0.0
-
-        if "pnl_pct" not in df.columns:
-            df["pnl_pct"] = 0.0
-        if "pnl_usd" not in df.columns:
-            df["pnl_usd"] = 0.0
-
-        df["time"] = pd.to_datetime(df["time"], errors="coerce")
-        df = df.dropna(subset=["time"])
-
         now_utc = datetime.now(timezone.utc)
         now_msk = now_utc + timedelta(hours=MOSCOW_OFFSET_HOURS)
 
@@ -942,23 +1326,29 @@ def get_pnl_today_per_symbol():
             hours=MOSCOW_OFFSET_HOURS
         )
 
-        today = df[
-            (df["time"] >= today_utc_start) & (df["time"] < tomorrow_utc_start)
-        ]
-
-        sells = today[today["type"].str.contains(SELL_PATTERN, na=False)]
-
-        if sells.empty:
-            return {}, 0.0, 0.0
-
-        grouped = sells.groupby("symbol")[["pnl_pct", "pnl_usd"]].sum()
-
-        per_symbol = {}
-        for sym, row in grouped.iterrows():
-            per_symbol[sym] = (float(row["pnl_pct"]), float(row["pnl_usd"]))
+        # time_utc хранится ISO-строкой, поэтому диапазон сравнивается лексикографически
+        conn = connect_db()
+        rows = conn.execute(
+            """
+            SELECT symbol, SUM(pnl_pct), SUM(pnl_usd)
+            FROM trades
+            WHERE time_utc >= ? AND time_utc < ? AND type REGEXP ?
+            GROUP BY symbol
+            """,
+            (
+                today_utc_start.strftime("%Y-%m-%dT%H:%M:%S"),
+                tomorrow_utc_start.strftime("%Y-%m-%dT%H:%M:%S"),
+                SELL_PATTERN,
+            ),
+        ).fetchall()
+        conn.close()
 
-        total_pnl_pct = float(grouped["pnl_pct"].sum())
-        total_usd = float(grouped["pnl_usd"].sum())
+        per_symbol = {
+            sym: (float(pnl_pct or 0.0), float(pnl_usd or 0.0))
+            for sym, pnl_pct, pnl_usd in rows
+        }
+        total_pnl_pct = sum(v[0] for v in per_symbol.values())
+        total_usd = sum(v[1] for v in per_symbol.values())
 
         return per_symbol, total_pnl_pct, total_usd
 
@@ -967,8 +1357,6 @@ def get_pnl_today_per_symbol():
         return {}, 0.0, 0.0
 
 
-# ================== СТАТИСТИКА ЭФФЕКТИВНОСТИ ==================
-
 def get_trading_statistics():
     """
     Рассчитывает статистику эффективности торговли:
@@ -983,7 +1371,7 @@ def get_trading_statistics():
     
     try:
         # Фильтруем только SELL сделки (они имеют P&L)
-        sells = df[df["type"].str.contains(SELL_PATTERN, na=False)].copy()
+        sells = df[df["type"].str.contains(SELL_RE, na=False)].copy()
         
         if sells.empty or len(sells) < 2:
             return None
@@ -1050,6 +1438,16 @@ def log_memory_usage():
         return 0.0
 
 
+MEMORY_LOG_INTERVAL_SEC = 300
+
+
+async def periodic(fn, interval_sec):
+    """Вызывает fn раз в interval_sec, пока бот работает."""
+    while running:
+        fn()
+        await asyncio.sleep(interval_sec)
+
+
 def plot_mini_chart(symbol, ohlcv):
     try:
         df = pd.DataFrame(
@@ -1107,9 +1505,62 @@ def with_start_button(markup=None):
     return markup
 
 
-async def send_telegram(text, photo=None, reply_markup=None):
+# Уведомления уходят через очередь: торговый цикл не ждёт ответа Telegram
+TG_QUEUE_MAXSIZE = 1000
+_TG_QUEUE = asyncio.Queue(maxsize=TG_QUEUE_MAXSIZE)
+
+
+def send_telegram(text, photo=None, reply_markup=None):
+    """Ставит сообщение в очередь на отправку и сразу возвращает управление."""
+    try:
+        _TG_QUEUE.put_nowait((text, photo, reply_markup))
+    except asyncio.QueueFull:
+        print(f"TG queue full, сообщение пропущено: {text[:60]}...")
+
+
+async def _tg_worker():
+    while True:
+        text, photo, reply_markup = await _TG_QUEUE.get()
+        try:
+            await _send_telegram_now(text, photo, reply_markup)
+        finally:
+            _TG_QUEUE.task_done()
+
+
+async def flush_telegram_queue(timeout=5.0):
+    """При остановке даём очереди дослать накопленное."""
+    try:
+        await asyncio.wait_for(_TG_QUEUE.join(), timeout)
+    except asyncio.TimeoutError:
+        print(f"TG: не отправлено {_TG_QUEUE.qsize()} сообщений")
+
+
+# Один Bot на процесс: его httpx-пул держит keep-alive соединения к api.telegram.org
+_TG_BOT = None
+
+
+async def get_tg_bot():
+    global _TG_BOT
+    if _TG_BOT is None:
+        bot = Bot(TELEGRAM_TOKEN)
+        await bot.initialize()
+        _TG_BOT = bot
+    return _TG_BOT
+
+
+async def close_tg_bot():
+    global _TG_BOT
+    if _TG_BOT is not None:
+        try:
+            await _TG_BOT.shutdown()
+        except Exception as e:
+            print(f"Ошибка закрытия TG-клиента: {e}")
+        _TG_BOT = None
+
+
+async def _send_telegram_now(text, photo=None, reply_markup=None):
     try:
-        bot = Application.builder().token(TELEGRAM_TOKEN).build().bot
+        bot = await get_tg_bot()
         reply_markup = with_start_button(reply_markup)
         if photo:
             await bot.send_photo(
@@ -1133,75 +1584,80 @@ async def send_telegram(text, photo=None, reply_markup=None):
 
 
 # ================== MARKET (КОРОТКИЙ) ==================
+# Индекс: -1/0/+1 (EMA50 против EMA200) + 1
+_TREND = ("📉 Падение", "➡️ Боковик", "📈 Рост")
+
+
+def _analyze_symbol(symbol, ohlcv) -> list[str]:
+    """Строки секции /market по одной монете: только вычисления, без сети."""
+    if isinstance(ohlcv, Exception):
+        return [f"❌ {symbol}: ошибка данных ({ohlcv})"]
+
+    # Сырой список ccxt сразу в ndarray — DataFrame здесь не нужен
+    arr = np.asarray(ohlcv, dtype=np.float64)
+    open_, high, low, close = arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4]
+    # Объём нужен только для сводки — float32 достаточно.
+    # Цены остаются float64: при ~1e5 float32 теряет 4-й знак после запятой.
+    vol = arr[:, 5].astype(np.float32)
+
+    current_price = close[-1]
+    open_24h = open_[0]
+    change_24h_pct = (current_price - open_24h) / open_24h * 100
+
+    ema50 = _ema_last(close, 50, adjust=True)
+    ema200 = _ema_last(close, 200, adjust=True)
+    trend = _TREND[(ema50 > ema200) - (ema50 < ema200) + 1]
+
+    current_rsi = _rsi_last(close)
+
+    vol_24h = float(vol.sum(dtype=np.float64))
+    avg_vol_24h = vol_24h / len(vol)
+    vol_ratio = float(vol[-1]) / avg_vol_24h if avg_vol_24h > 0 else 0.0
+
+    support = low.min()
+    resistance = high.max()
+
+    pair_link = PAIR_LINKS[symbol]
+
+    return [
+        f"📊 <b>Анализ ({pair_link})</b>",
+        f"Цена: <b>{current_price:,.4f}</b> ({change_24h_pct:+.2f}%)",
+        f"Тренд: {trend}",
+        f"RSI(14): <b>{current_rsi:.1f}</b>",
+        f"Объём (24ч): {vol_24h:,.0f} | Текущий: {vol_ratio:.1f}x",
+        f"Поддержка: <b>{support:,.2f}</b>",
+        f"Сопротивление: <b>{resistance:,.2f}</b>",
+    ]
+
+
 async def cmd_market(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_authorized_user(update):
         return
 
     try:
-        ex = get_exchange()
-        sections = []
+        aex = await get_async_exchange()
 
-        for code, symbol in COINS.items():
-            try:
-                ohlcv = ex.fetch_ohlcv(symbol, "1m", limit=1440)
-            except Exception as e:
-                sections.append(f"❌ {symbol}: ошибка данных ({e})")
-                continue
+        # Все запросы идут параллельно: время = самый медленный из них
+        ohlcvs = await asyncio.gather(
+            *[ex_call(aex.fetch_ohlcv, symbol, "1m", limit=1440) for symbol in SYMBOLS],
+            return_exceptions=True,
+        )
 
-            df = pd.DataFrame(
-                ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
+        # Расчёты по монетам — в пуле потоков, чтобы не держать event loop
+        sections = await asyncio.gather(
+            *(
+                asyncio.to_thread(_analyze_symbol, symbol, ohlcv)
+                for symbol, ohlcv in zip(SYMBOLS, ohlcvs)
             )
-            df["close"] = df["close"].astype(float)
-            df["volume"] = df["volume"].astype(float)
-
-            current_price = df["close"].iloc[-1]
-            open_24h = df["open"].iloc[0]
-            change_24h_pct = (current_price - open_24h) / open_24h * 100
-
-            df["ema50"] = df["close"].ewm(span=50).mean()
-            df["ema200"] = df["close"].ewm(span=200).mean()
-            ema50 = df["ema50"].iloc[-1]
-            ema200 = df["ema200"].iloc[-1]
-            if ema50 > ema200:
-                trend = "📈 Рост"
-            elif ema50 < ema200:
-                trend = "📉 Падение"
-            else:
-                trend = "➡️ Боковик"
-
-            delta = df["close"].diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.rolling(14).mean()
-            avg_loss = loss.rolling(14).mean()
-            rs = avg_gain / avg_loss
-            df["rsi"] = 100 - (100 / (1 + rs))
-            current_rsi = df["rsi"].iloc[-1]
-
-            vol_24h = df["volume"].sum()
-            avg_vol_24h = df["volume"].mean()
-            vol_ratio = df["volume"].iloc[-1] / avg_vol_24h if avg_vol_24h > 0 else 0.0
-
-            support = df["low"].min()
-            resistance = df["high"].max()
-
-            pair_code = symbol.replace("/", "")
-            pair_url = PAIR_URL_TEMPLATE.format(pair=pair_code)
-            pair_link = f'<a href="{pair_url}">{symbol}</a>'
-
-            sec = (
-                f"📊 <b>Анализ ({pair_link})</b>\n"
-                f"Цена: <b>{current_price:,.4f}</b> ({change_24h_pct:+.2f}%)\n"
-                f"Тренд: {trend}\n"
-                f"RSI(14): <b>{current_rsi:.1f}</b>\n"
-                f"Объём (24ч): {vol_24h:,.0f} | Текущий: {vol_ratio:.1f}x\n"
-                f"Поддержка: <b>{support:,.2f}</b>\n"
-                f"Сопротивление: <b>{resistance:,.2f}</b>"
-            )
-
-            sections.append(sec)
+        )
 
-        msg = "\n\n".join(sections) + "\n\n/start"
+        # Один join на всё сообщение; пустая строка — разделитель секций
+        lines = []
+        for section in sections:
+            lines.extend(section)
+            lines.append("")
+        lines.append("/start")
+        msg = "\n".join(lines)
 
         if update.message:
             await update.message.reply_text(
@@ -1231,7 +1687,7 @@ async def cmd_market(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ================== START / MAIN MENU ==================
-def build_main_keyboard():
+def _build_main_keyboard_impl():
     return InlineKeyboardMarkup(
         [
             [
@@ -1254,33 +1710,44 @@ def build_main_keyboard():
     )
 
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not is_authorized_user(update):
-        return
+# Клавиатуры статичны — собираем один раз (уже с кнопкой /start)
+_MAIN_KEYBOARD = with_start_button(_build_main_keyboard_impl())
+
 
-    ex = get_exchange()
-    balance = ex.fetch_balance()
+def build_main_keyboard():
+    return _MAIN_KEYBOARD
+
+
+# Шаблоны строки позиции: индекс — pos["in_position"]
+_POS_LINE_TEMPLATES = (
+    "🔴 {code}: нет позиции | риск {risk:+d}",
+    "🟢 {code}: {amount:.6f} @ {entry:,.4f} | риск {risk:+d}",
+)
+
+
+def fmt_pos_line(code, sym) -> str:
+    pos = positions[sym]
+    return _POS_LINE_TEMPLATES[bool(pos["in_position"])].format(
+        code=code,
+        amount=pos["amount"],
+        entry=pos["entry_price"],
+        risk=ADAPTIVE_STATE.get(sym, {}).get("risk_level", 0),
+    )
+
+
+async def _render_start_text() -> str:
+    """Текст главного экрана: баланс, позиции и P&L за день."""
+    balance = await fetch_balance_cached()
     usdt = float(balance.get("USDT", {}).get("free", 0))
     btc = float(balance.get("BTC", {}).get("free", 0))
     eth = float(balance.get("ETH", {}).get("free", 0))
     sol = float(balance.get("SOL", {}).get("free", 0))
     xrp = float(balance.get("XRP", {}).get("free", 0))
-    pnl_pct, pnl_usd = get_pnl_today()
+    _, pnl_pct, pnl_usd = get_pnl_today_per_symbol()
 
-    pos_lines = []
-    for code, sym in COINS.items():
-        pos = positions[sym]
-        risk = ADAPTIVE_STATE.get(sym, {}).get("risk_level", 0)
-        adapt_label = f" | риск {risk:+d}"
-        if pos["in_position"]:
-            pos_lines.append(
-                f"🟢 {code}: {pos['amount']:.6f} @ {pos['entry_price']:,.4f}{adapt_label}"
-            )
-        else:
-            pos_lines.append(f"🔴 {code}: нет позиции{adapt_label}")
-    positions_block = "\n".join(pos_lines)
+    positions_block = "\n".join(fmt_pos_line(code, sym) for code, sym in COIN_ITEMS)
 
-    text = (
+    return (
         f"💼 <b>Текущий баланс</b>\n"
         f"USDT: {usdt:,.2f}\n"
         f"BTC: {btc:.6f}\n"
@@ -1293,9 +1760,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"В USDT: ${pnl_usd:+.2f}"
     )
 
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_authorized_user(update):
+        return
+
+    text = await _render_start_text()
+
     await update.message.reply_text(
         text,
-        reply_markup=with_start_button(build_main_keyboard()),
+        reply_markup=build_main_keyboard(),
         parse_mode="HTML",
         disable_web_page_preview=True,
     )
@@ -1308,52 +1782,21 @@ async def start_from_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
 
-    ex = get_exchange()
-    balance = ex.fetch_balance()
-    usdt = float(balance.get("USDT", {}).get("free", 0))
-    btc = float(balance.get("BTC", {}).get("free", 0))
-    eth = float(balance.get("ETH", {}).get("free", 0))
-    sol = float(balance.get("SOL", {}).get("free", 0))
-    xrp = float(balance.get("XRP", {}).get("free", 0))
-    pnl_pct, pnl_usd = get_pnl_today()
-
-    pos_lines = []
-    for code, sym in COINS.items():
-        pos = positions[sym]
-        risk = ADAPTIVE_STATE.get(sym, {}).get("risk_level", 0)
-        adapt_label = f" | риск {risk:+d}"
-        if pos["in_position"]:
-            pos_lines.append(
-                f"🟢 {code}: {pos['amount']:.6f} @ {pos['entry_price']:,.4f}{adapt_label}"
-            )
-        else:
-            pos_lines.append(f"🔴 {code}: нет позиции{adapt_label}")
-    positions_block = "\n".join(pos_lines)
-
-    text = (
-        f"💼 <b>Текущий баланс</b>\n"
-        f"USDT: {usdt:,.2f}\n"
-        f"BTC: {btc:.6f}\n"
-        f"ETH: {eth:.6f}\n"
-        f"SOL: {sol:.6f}\n"
-        f"XRP: {xrp:.2f}\n\n"
-        f"{positions_block}\n\n"
-        f"📊 <b>P&L за день (МСК)</b>\n"
-        f"В %: {pnl_pct:+.2f}%\n"
-        f"В USDT: ${pnl_usd:+.2f}"
-    )
+    text = await _render_start_text()
 
     try:
         await query.edit_message_text(
             text,
-            reply_markup=with_start_button(build_main_keyboard()),
+            reply_markup=build_main_keyboard(),
             parse_mode="HTML",
             disable_web_page_preview=True,
         )
-    except Exception as e:
+    except BadRequest as e:
         # Игнорируем ошибку "Message is not modified"
-        if "message is not modified" not in str(e).lower():
+        if not e.message.startswith("Message is not modified"):
             print(f"Edit message error: {e}")
+    except Exception as e:
+        print(f"Edit message error: {e}")
 
 
 # ================== REPORT / PNL BUTTONS ==================
@@ -1377,11 +1820,10 @@ async def handle_report(query, day: str | None = None):
         if "pnl_usd" not in df.columns:
             df["pnl_usd"] = 0.0
 
-        df["time"] = pd.to_datetime(df["time"], errors="coerce")
-        df = df.dropna(subset=["time"])
-        df["date"] = df["time"].dt.date
-
-        dates = sorted(df["date"].unique(), reverse=True)
+        # time уже datetime64 UTC: сортируем один раз и режем дни через searchsorted
+        df = df.dropna(subset=["time"]).sort_values("time", ignore_index=True)
+        days = df["time"].dt.normalize().unique()
+        dates = [d.date() for d in days[-7:][::-1]]
         if not dates:
             await query.message.reply_text(
                 "📊 Нет данных для отчёта", reply_markup=with_start_button()
@@ -1390,7 +1832,7 @@ async def handle_report(query, day: str | None = None):
 
         if day is None:
             btn_rows = []
-            for d in dates[:7]:
+            for d in dates:
                 btn_rows.append(
                     [InlineKeyboardButton(str(d), callback_data=f"report_day_{d}")]
                 )
@@ -1409,7 +1851,9 @@ async def handle_report(query, day: str | None = None):
             )
             return
 
-        day_df = df[df["date"] == selected_date]
+        start_ts = pd.Timestamp(selected_date, tz="UTC")
+        i0, i1 = df["time"].searchsorted([start_ts, start_ts + pd.Timedelta(days=1)])
+        day_df = df.iloc[i0:i1]
         if day_df.empty:
             await query.message.reply_text(
                 f"📊 Сделок {selected_date} не найдено",
@@ -1421,23 +1865,37 @@ async def handle_report(query, day: str | None = None):
         total_pct = 0.0
         total_usd = 0.0
 
-        for code, sym in COINS.items():
-            s_df = day_df[day_df["symbol"] == sym]
-            buys = s_df[s_df["type"].str.contains("BUY", na=False)]
-            sells = s_df[s_df["type"].str.contains(SELL_PATTERN, na=False)]
-            pnl_pct = sells["pnl_pct"].sum() if not sells.empty else 0.0
-            pnl_usd = sells["pnl_usd"].sum() if not sells.empty else 0.0
+        # Один проход по дню: классификация типов и группировка по символу
+        is_buy = day_df["type"].str.contains(BUY_RE, na=False)
+        is_sell = day_df["type"].str.contains(SELL_RE, na=False)
+        buy_counts = day_df.loc[is_buy, "symbol"].value_counts().reindex(SYMBOLS, fill_value=0)
+        sell_agg = (
+            day_df[is_sell]
+            .groupby("symbol")
+            .agg(
+                sells=("pnl_pct", "size"),
+                pnl_pct=("pnl_pct", "sum"),
+                pnl_usd=("pnl_usd", "sum"),
+            )
+            .reindex(SYMBOLS, fill_value=0)
+        )
+
+        for (code, sym), buys, row in zip(
+            COIN_ITEMS, buy_counts.tolist(), sell_agg.itertuples(index=False)
+        ):
+            pnl_pct = float(row.pnl_pct)
+            pnl_usd = float(row.pnl_usd)
             total_pct += pnl_pct
             total_usd += pnl_usd
             lines.append(
-                f"{code}: BUY {len(buys)} | SELL {len(sells)} | P&L {pnl_pct:+.2f}% | ${pnl_usd:+.2f}"
+                f"{code}: BUY {buys} | SELL {int(row.sells)} | P&L {pnl_pct:+.2f}% | ${pnl_usd:+.2f}"
             )
 
         lines.append(f"\nИтого: {total_pct:+.2f}% | ${total_usd:+.2f}")
 
         keyboard = [
             [InlineKeyboardButton(str(d), callback_data=f"report_day_{d}")]
-            for d in dates[:7]
+            for d in dates
         ]
         keyboard.append([InlineKeyboardButton("⏪ Назад", callback_data="back_to_main")])
 
@@ -1460,7 +1918,7 @@ async def show_pnl_per_symbol(query):
         lines.append("По монетам: сделок сегодня ещё не было.")
     else:
         lines.append("<b>По монетам:</b>")
-        for code, symbol in COINS.items():
+        for code, symbol in COIN_ITEMS:
             spct, susd = per_symbol.get(symbol, (0.0, 0.0))
             spct_disp = spct if abs(spct) >= 0.01 else 0.0
             susd_disp = susd if abs(susd) >= 0.01 else 0.0
@@ -1519,11 +1977,22 @@ async def show_statistics(query):
 
 
 # ================== SETTINGS MENUS ==================
+_SETTINGS_ROOT_KB = with_start_button(
+    InlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton("⚙️ Настройки торговли", callback_data="settings_trading")],
+            [InlineKeyboardButton("💰 Настройки депозита", callback_data="settings_deposits")],
+            [InlineKeyboardButton("⏪ Назад", callback_data="back_to_main")],
+        ]
+    )
+)
+
+
 async def show_settings_menu(message):
     cfg = STRATEGY_CONFIG
 
     coin_status_lines = []
-    for code, sym in COINS.items():
+    for code, sym in COIN_ITEMS:
         coin_status_lines.append(
             f"{code}: {'✅ ВКЛ' if ACTIVE_COINS.get(sym, True) else '❌ ВЫКЛ'}"
         )
@@ -1545,16 +2014,9 @@ async def show_settings_menu(message):
         f"Мин. ордер: ${cfg['min_order_usd']}"
     )
 
-    keyboard = [
-        [InlineKeyboardButton("⚙️ Настройки торговли", callback_data="settings_trading")],
-        [InlineKeyboardButton("💰 Настройки депозита", callback_data="settings_deposits")],
-        [InlineKeyboardButton("⏪ Назад", callback_data="back_to_main")],
-    ]
-    reply_markup = with_start_button(InlineKeyboardMarkup(keyboard))
-
     await message.edit_text(
         text,
-        reply_markup=reply_markup,
+        reply_markup=_SETTINGS_ROOT_KB,
         parse_mode="HTML",
         disable_web_page_preview=True,
     )
@@ -1564,7 +2026,7 @@ async def show_trading_settings_menu(message):
     cfg = STRATEGY_CONFIG
 
     coin_status_lines = []
-    for code, sym in COINS.items():
+    for code, sym in COIN_ITEMS:
         coin_status_lines.append(
             f"{code}: {'✅ ВКЛ' if ACTIVE_COINS.get(sym, True) else '❌ ВЫКЛ'}"
         )
@@ -1657,7 +2119,7 @@ async def show_trading_settings_menu(message):
 
 async def show_deposit_settings_menu(message):
     dep_lines = []
-    for code, sym in COINS.items():
+    for code, sym in COIN_ITEMS:
         dep = TRADE_DEPOSITS.get(sym, 0.0)
         dep_lines.append(f"{code}: {dep:.0f} USDT")
     deps_text = "\n".join(dep_lines)
@@ -1697,6 +2159,38 @@ async def show_deposit_settings_menu(message):
     )
 
 
+# callback_data -> (ключ STRATEGY_CONFIG, подпись)
+SETTING_TOGGLES = {
+    "set_auto_toggle": ("auto_enabled", "Авто-торговля"),
+    "set_notify_toggle": ("notifications_enabled", "Уведомления"),
+}
+
+
+def _setting_steps(name, key, step, lo, hi, fmt):
+    return {
+        f"set_{name}_dec": (key, -step, lo, hi, fmt),
+        f"set_{name}_inc": (key, step, lo, hi, fmt),
+    }
+
+
+# callback_data -> (ключ, шаг, минимум, максимум, форматтер ответа)
+SETTING_DELTAS = {
+    **_setting_steps("price_int", "price_update_interval_sec", 60, 60, 3600,
+                     lambda v: f"Интервал цен: {v//60} мин"),
+    **_setting_steps("sl", "sl_pct", 0.001, 0.005, 0.1, lambda v: f"SL: {v*100:.1f}%"),
+    **_setting_steps("tp", "tp_pct", 0.001, 0.01, 0.2, lambda v: f"TP: {v*100:.1f}%"),
+    **_setting_steps("rsi_min", "rsi_min", 5, 30, 90, lambda v: f"RSI Min: {v}"),
+    **_setting_steps("rsi_max", "rsi_max", 5, 30, 90, lambda v: f"RSI Max: {v}"),
+    **_setting_steps("vol", "volume_mult", 0.1, 1.0, 5.0, lambda v: f"Объём: {v:.1f}x"),
+    **_setting_steps("atr", "atr_threshold_pct", 0.001, 0.001, 0.05,
+                     lambda v: f"ATR порог: {v*100:.1f}%"),
+    **_setting_steps("min_interval_sec", "min_interval_sec", 10, 0, 300,
+                     lambda v: f"Интервал сделок: {v} сек"),
+    **_setting_steps("min_order_usd", "min_order_usd", 1, 1, 100,
+                     lambda v: f"Мин. ордер: ${v}"),
+}
+
+
 async def handle_settings_change(query, context):
     global STRATEGY_CONFIG, ACTIVE_COINS, TRADE_DEPOSITS
     data = query.data
@@ -1716,7 +2210,7 @@ async def handle_settings_change(query, context):
 
         TRADE_DEPOSITS[symbol] = cur
         await query.answer(f"{code} депо: {cur:.0f} USDT")
-        save_state()
+        mark_state_dirty()
         await show_deposit_settings_menu(query.message)
         return
 
@@ -1728,110 +2222,29 @@ async def handle_settings_change(query, context):
             await query.answer(
                 f"{coin_code}: {'ВКЛ' if ACTIVE_COINS[symbol] else 'ВЫКЛ'}"
             )
-        save_state()
+        mark_state_dirty()
         await show_trading_settings_menu(query.message)
         return
 
-    if data == "set_auto_toggle":
-        STRATEGY_CONFIG["auto_enabled"] = not STRATEGY_CONFIG["auto_enabled"]
-        await query.answer(
-            f"Авто-торговля: {'ВКЛ' if STRATEGY_CONFIG['auto_enabled'] else 'ВЫКЛ'}"
-        )
-
-    elif data == "set_notify_toggle":
-        STRATEGY_CONFIG["notifications_enabled"] = not STRATEGY_CONFIG[
-            "notifications_enabled"
-        ]
-        await query.answer(
-            f"Уведомления: {'ВКЛ' if STRATEGY_CONFIG['notifications_enabled'] else 'ВЫКЛ'}"
-        )
-
-    elif data == "set_price_int_dec":
-        STRATEGY_CONFIG["price_update_interval_sec"] = max(
-            60, STRATEGY_CONFIG["price_update_interval_sec"] - 60
-        )
-        await query.answer(
-            f"Интервал цен: {STRATEGY_CONFIG['price_update_interval_sec']//60} мин"
-        )
-
-    elif data == "set_price_int_inc":
-        STRATEGY_CONFIG["price_update_interval_sec"] = min(
-            3600, STRATEGY_CONFIG["price_update_interval_sec"] + 60
-        )
-        await query.answer(
-            f"Интервал цен: {STRATEGY_CONFIG['price_update_interval_sec']//60} мин"
-        )
-
-    elif data == "set_sl_dec":
-        STRATEGY_CONFIG["sl_pct"] = max(0.005, STRATEGY_CONFIG["sl_pct"] - 0.001)
-        await query.answer(f"SL: {STRATEGY_CONFIG['sl_pct']*100:.1f}%")
-    elif data == "set_sl_inc":
-        STRATEGY_CONFIG["sl_pct"] = min(0.1, STRATEGY_CONFIG["sl_pct"] + 0.001)
-        await query.answer(f"SL: {STRATEGY_CONFIG['sl_pct']*100:.1f}%")
-
-    elif data == "set_tp_dec":
-        STRATEGY_CONFIG["tp_pct"] = max(0.01, STRATEGY_CONFIG["tp_pct"] - 0.001)
-        await query.answer(f"TP: {STRATEGY_CONFIG['tp_pct']*100:.1f}%")
-    elif data == "set_tp_inc":
-        STRATEGY_CONFIG["tp_pct"] = min(0.2, STRATEGY_CONFIG["tp_pct"] + 0.001)
-        await query.answer(f"TP: {STRATEGY_CONFIG['tp_pct']*100:.1f}%")
-
-    elif data == "set_rsi_min_dec":
-        STRATEGY_CONFIG["rsi_min"] = max(30, STRATEGY_CONFIG["rsi_min"] - 5)
-        await query.answer(f"RSI Min: {STRATEGY_CONFIG['rsi_min']}")
-    elif data == "set_rsi_min_inc":
-        STRATEGY_CONFIG["rsi_min"] = min(90, STRATEGY_CONFIG["rsi_min"] + 5)
-        await query.answer(f"RSI Min: {STRATEGY_CONFIG['rsi_min']}")
-    elif data == "set_rsi_max_dec":
-        STRATEGY_CONFIG["rsi_max"] = max(30, STRATEGY_CONFIG["rsi_max"] - 5)
-        await query.answer(f"RSI Max: {STRATEGY_CONFIG['rsi_max']}")
-    elif data == "set_rsi_max_inc":
-        STRATEGY_CONFIG["rsi_max"] = min(90, STRATEGY_CONFIG["rsi_max"] + 5)
-        await query.answer(f"RSI Max: {STRATEGY_CONFIG['rsi_max']}")
-
-    elif data == "set_vol_dec":
-        STRATEGY_CONFIG["volume_mult"] = max(1.0, STRATEGY_CONFIG["volume_mult"] - 0.1)
-        await query.answer(f"Объём: {STRATEGY_CONFIG['volume_mult']:.1f}x")
-    elif data == "set_vol_inc":
-        STRATEGY_CONFIG["volume_mult"] = min(5.0, STRATEGY_CONFIG["volume_mult"] + 0.1)
-        await query.answer(f"Объём: {STRATEGY_CONFIG['volume_mult']:.1f}x")
-
-    elif data == "set_atr_dec":
-        STRATEGY_CONFIG["atr_threshold_pct"] = max(
-            0.001, STRATEGY_CONFIG["atr_threshold_pct"] - 0.001
-        )
-        await query.answer(
-            f"ATR порог: {STRATEGY_CONFIG['atr_threshold_pct']*100:.1f}%"
-        )
-    elif data == "set_atr_inc":
-        STRATEGY_CONFIG["atr_threshold_pct"] = min(
-            0.05, STRATEGY_CONFIG["atr_threshold_pct"] + 0.001
-        )
-        await query.answer(
-            f"ATR порог: {STRATEGY_CONFIG['atr_threshold_pct']*100:.1f}%"
-        )
-
-    elif data == "set_min_interval_sec_dec":
-        STRATEGY_CONFIG["min_interval_sec"] = max(
-            0, STRATEGY_CONFIG["min_interval_sec"] - 10
-        )
-        await query.answer(f"Интервал сделок: {STRATEGY_CONFIG['min_interval_sec']} сек")
-    elif data == "set_min_interval_sec_inc":
-        STRATEGY_CONFIG["min_interval_sec"] = min(
-            300, STRATEGY_CONFIG["min_interval_sec"] + 10
-        )
-        await query.answer(f"Интервал сделок: {STRATEGY_CONFIG['min_interval_sec']} сек")
-
-    elif data == "set_min_order_usd_dec":
-        STRATEGY_CONFIG["min_order_usd"] = max(1, STRATEGY_CONFIG["min_order_usd"] - 1)
-        await query.answer(f"Мин. ордер: ${STRATEGY_CONFIG['min_order_usd']}")
-    elif data == "set_min_order_usd_inc":
-        STRATEGY_CONFIG["min_order_usd"] = min(
-            100, STRATEGY_CONFIG["min_order_usd"] + 1
-        )
-        await query.answer(f"Мин. ордер: ${STRATEGY_CONFIG['min_order_usd']}")
+    toggle = SETTING_TOGGLES.get(data)
+    if toggle is not None:
+        key, label = toggle
+        STRATEGY_CONFIG[key] = not STRATEGY_CONFIG[key]
+        await query.answer(f"{label}: {'ВКЛ' if STRATEGY_CONFIG[key] else 'ВЫКЛ'}")
+
+    step = SETTING_DELTAS.get(data)
+    if step is not None:
+        key, delta, lo, hi, fmt = step
+        # Клампим только в сторону движения — как и раньше, значение вне
+        # диапазона (например, из state.json) не «прыгает» на другую границу
+        if delta < 0:
+            value = max(lo, STRATEGY_CONFIG[key] + delta)
+        else:
+            value = min(hi, STRATEGY_CONFIG[key] + delta)
+        STRATEGY_CONFIG[key] = value
+        await query.answer(fmt(value))
 
-    save_state()
+    mark_state_dirty()
     await show_trading_settings_menu(query.message)
 
 
@@ -1839,14 +2252,9 @@ async def cmd_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_authorized_user(update):
         return
 
-    keyboard = [
-        [InlineKeyboardButton("⚙️ Настройки торговли", callback_data="settings_trading")],
-        [InlineKeyboardButton("💰 Настройки депозита", callback_data="settings_deposits")],
-        [InlineKeyboardButton("⏪ Назад", callback_data="back_to_main")],
-    ]
     await update.message.reply_text(
         "⚙️ <b>Настройки</b>",
-        reply_markup=with_start_button(InlineKeyboardMarkup(keyboard)),
+        reply_markup=_SETTINGS_ROOT_KB,
         parse_mode="HTML",
         disable_web_page_preview=True,
     )
@@ -1859,7 +2267,7 @@ async def execute_trade(symbol, signal, price, ex, cfg):
     pos = positions[symbol]
 
     if signal == "BUY" and not pos["in_position"]:
-        balance = ex.fetch_balance()
+        balance = await fetch_balance_cached()
         usdt = float(balance.get("USDT", {}).get("free", 0))
 
         amount_usd = TRADE_DEPOSITS.get(symbol, cfg["min_order_usd"])
@@ -1875,7 +2283,8 @@ async def execute_trade(symbol, signal, price, ex, cfg):
         amount_str = ex.amount_to_precision(symbol, max(amount, 0.000001))
 
         try:
-            order = ex.create_market_buy_order(symbol, amount_str)
+            order = await ex_call(ex.create_market_buy_order, symbol, amount_str)
+            invalidate_balance_cache()
             filled = float(order.get("filled", 0))
             avg_price = float(order.get("average") or price)
             if filled > 0:
@@ -1891,7 +2300,7 @@ async def execute_trade(symbol, signal, price, ex, cfg):
                         "trailing_stop": 0.0,        # Начальное значение
                     }
                 )
-                save_state()
+                mark_state_dirty()
                 log_trade(
                     {
                         "type": "AUTO_BUY",
@@ -1903,7 +2312,9 @@ async def execute_trade(symbol, signal, price, ex, cfg):
                         "pnl_usd": 0.0,
                     }
                 )
-                chart = plot_mini_chart(symbol, ex.fetch_ohlcv(symbol, "1m", limit=50))
+                chart_ohlcv = await ex_call(ex.fetch_ohlcv, symbol, "1m", limit=50)
+                # matplotlib рендерит долго — не держим event loop
+                chart = await asyncio.to_thread(plot_mini_chart, symbol, chart_ohlcv)
                 
                 # Рассчитываем уровни для сообщения
                 sl_level = avg_price * (1 - cfg['sl_pct'])
@@ -1921,7 +2332,7 @@ async def execute_trade(symbol, signal, price, ex, cfg):
                     f"🎯 TP: {tp_level:.4f} (+{cfg['tp_pct']*100:.1f}%)"
                     f"{trailing_info}"
                 )
-                await send_telegram(msg, photo=chart)
+                send_telegram(msg, photo=chart)
                 print(f"[{symbol}] AUTO BUY: {filled:.6f} @ {avg_price:,.4f}")
                 last_trade_time[symbol] = time.time()
         except Exception as e:
@@ -1931,7 +2342,7 @@ async def execute_trade(symbol, signal, price, ex, cfg):
         try:
             # базовая монета (BTC, ETH, SOL, XRP)
             base_code = symbol.split("/")[0]
-            balance = ex.fetch_balance()
+            balance = await fetch_balance_cached(force=True)
             base_info = balance.get(base_code, {})
             avail_amount = float(base_info.get("free") or 0)
 
@@ -1941,8 +2352,8 @@ async def execute_trade(symbol, signal, price, ex, cfg):
             if sell_amount <= 0:
                 print(f"[{symbol}] SELL: нет доступного баланса, помечаем позицию как закрытую")
                 pos["in_position"] = False
-                save_state()
-                await send_telegram(
+                mark_state_dirty()
+                send_telegram(
                     f"⚠️ <b>Не удалось продать {symbol}</b>\n"
                     f"Биржа показывает нулевой доступный баланс.\n"
                     f"Позиция помечена как закрытая в боте.\n\n"
@@ -1953,14 +2364,15 @@ async def execute_trade(symbol, signal, price, ex, cfg):
             amount_str = ex.amount_to_precision(symbol, sell_amount)
 
             try:
-                order = ex.create_market_sell_order(symbol, amount_str)
+                order = await ex_call(ex.create_market_sell_order, symbol, amount_str)
             except Exception as e:
+                invalidate_balance_cache()
                 msg = str(e)
                 if "balance not enough" in msg:
                     # чтобы не зациклиться: помечаем как закрытую и предупреждаем
                     pos["in_position"] = False
-                    save_state()
-                    await send_telegram(
+                    mark_state_dirty()
+                    send_telegram(
                         f"⚠️ <b>SELL ошибка по {symbol}</b>\n"
                         f"Биржа пишет, что баланса не хватает для продажи.\n"
                         f"Проверь позицию вручную на бирже.\n\n"
@@ -1972,6 +2384,7 @@ async def execute_trade(symbol, signal, price, ex, cfg):
                     print(f"[{symbol}] SELL Error: {msg}")
                     return
 
+            invalidate_balance_cache()
             avg_price = float(order.get("average") or price)
             filled = float(order.get("filled", 0))
             if filled > 0:
@@ -1993,66 +2406,73 @@ async def execute_trade(symbol, signal, price, ex, cfg):
                 )
                 adaptive_on_trade(symbol, "AUTO_SELL", pnl_pct)
                 pos["in_position"] = False
-                save_state()
+                mark_state_dirty()
                 msg = (
                     f"✅ <b>АВТО-ПРОДАЖА</b>\n"
                     f"{symbol} @ <b>{avg_price:,.4f}</b>\n"
                     f"Объём (USDT): {usd_received:.2f}\n"
                     f"P&L: <b>{pnl_pct:+.2f}%</b> | <b>${pnl_usd:+.2f}</b>"
                 )
-                await send_telegram(msg)
+                send_telegram(msg)
                 print(f"[{symbol}] AUTO SELL: P&L {pnl_pct:+.2f}% (${pnl_usd:+.2f})")
                 last_trade_time[symbol] = time.time()
         except Exception as e:
             print(f"[{symbol}] SELL Error (outer): {e}")
 
 
-async def send_all_price_update(current_prices_dict):
-    global last_price, price_initialized, day_open_price
+# Общий буфер для текстов уведомлений: сбрасывается на каждое сообщение.
+# Между reset_msg_buf() и getvalue() не должно быть await.
+_MSG_BUF = io.StringIO()
 
-    msg_lines = ["🔔 <b>Обновление цен</b>\n"]
 
-    for symbol in SYMBOLS:
-        price = current_prices_dict.get(symbol)
+def reset_msg_buf():
+    _MSG_BUF.seek(0)
+    _MSG_BUF.truncate(0)
+    return _MSG_BUF
+
+
+async def send_all_price_update():
+    buf = reset_msg_buf()
+    buf.write("🔔 <b>Обновление цен</b>\n")
+
+    for i, (last, day_open, price) in enumerate(prices.tolist()):
         if not price:
             continue
+        symbol = SYMBOLS[i]
 
-        pair_code = symbol.replace("/", "")
-        pair_url = PAIR_URL_TEMPLATE.format(pair=pair_code)
-        pair_link = f'<a href="{pair_url}">{symbol}</a>'
+        pair_link = PAIR_LINKS[symbol]
 
-        if day_open_price[symbol] and day_open_price[symbol] > 0:
-            change_pct = (price - day_open_price[symbol]) / day_open_price[symbol] * 100
+        if day_open > 0:
+            change_pct = (price - day_open) / day_open * 100
         else:
-            if last_price[symbol] == 0:
+            if last == 0:
                 change_pct = 0.0
             else:
-                change_pct = (price - last_price[symbol]) / last_price[symbol] * 100
+                change_pct = (price - last) / last * 100
 
         arrow = "📈" if change_pct >= 0 else "📉"
         change_str = (
             f"{change_pct:+.2f}%" if abs(change_pct) >= 0.01 else f"{change_pct:+.4f}%"
         )
 
-        msg_lines.append(f"{pair_link}: <b>{price:,.4f}</b> {arrow} ({change_str})")
+        buf.write(f"\n{pair_link}: <b>{price:,.4f}</b> {arrow} ({change_str})")
 
-        last_price[symbol] = price
+        prices[i, PRICE_LAST] = price
         price_initialized[symbol] = True
 
-    total_pct, total_usd = get_pnl_today()
+    _, total_pct, total_usd = get_pnl_today_per_symbol()
     pnl_pct_display = total_pct if abs(total_pct) >= 0.01 else 0.00
     pnl_usd_display = total_usd if abs(total_usd) >= 0.01 else 0.00
 
-    msg_lines.append(
-        "\n📊 <b>P&L за сегодня (МСК)</b>\n"
+    buf.write(
+        "\n\n📊 <b>P&L за сегодня (МСК)</b>\n"
         f"В %: <b>{pnl_pct_display:+.2f}%</b>\n"
         f"В USDT: <b>${pnl_usd_display:+.2f}</b>\n\n"
         f"/start"
     )
 
-    msg = "\n".join(msg_lines)
-    await send_telegram(msg)
-    save_state()
+    send_telegram(buf.getvalue())
+    mark_state_dirty()
 
 
 async def detect_manual_trades(ex):
@@ -2062,23 +2482,20 @@ async def detect_manual_trades(ex):
     """
     global manual_seen_trade_ids
 
-    for symbol in SYMBOLS:
-        try:
-            trades = ex.fetch_my_trades(symbol, limit=20)
-        except Exception as e:
-            print(f"[{symbol}] fetch_my_trades error: {e}")
-            continue
+    # Сделки по всем монетам запрашиваем параллельно
+    results = await asyncio.gather(
+        *(ex_call(ex.fetch_my_trades, symbol, limit=20) for symbol in SYMBOLS),
+        return_exceptions=True,
+    )
 
-        if not trades:
+    new_trades = {}
+    for symbol, trades in zip(SYMBOLS, results):
+        if isinstance(trades, Exception):
+            print(f"[{symbol}] fetch_my_trades error: {trades}")
             continue
 
-        try:
-            ticker = ex.fetch_ticker(symbol)
-            cur_price = float(ticker["last"])
-        except Exception:
-            cur_price = None
-
-        for t in trades:
+        fresh = []
+        for t in trades or []:
             tid = t.get("id") or t.get("tradeId")
             if tid is None:
                 continue
@@ -2087,7 +2504,18 @@ async def detect_manual_trades(ex):
                 continue  # уже видели
 
             manual_seen_trade_ids.add(tid)
+            fresh.append(t)
+        if fresh:
+            new_trades[symbol] = fresh
+
+    for symbol, trades in new_trades.items():
+        try:
+            cur_price = await cached_last(symbol)
+        except Exception as e:
+            print(f"[{symbol}] detect_manual_trades: ticker error: {e}")
+            cur_price = None
 
+        for t in trades:
             ts = t.get("timestamp")
             is_bot_like = False
             if ts is not None and last_trade_time.get(symbol):
@@ -2112,25 +2540,24 @@ async def detect_manual_trades(ex):
                 elif side == "SELL":
                     pnl_pct = (price / cur_price - 1) * 100
 
-            pair_code = symbol.replace("/", "")
-            pair_url = PAIR_URL_TEMPLATE.format(pair=pair_code)
-            pair_link = f'<a href="{pair_url}">{symbol}</a>'
+            pair_link = PAIR_LINKS[symbol]
 
-            msg_lines = [
-                "🔎 <b>Обнаружена сделка на бирже</b>",
-                f"{pair_link} {side} @ <b>{price:,.4f}</b>",
-                f"Объём: {amount:.6f} (~{usd_value:.2f} USDT)",
-            ]
+            buf = reset_msg_buf()
+            buf.write(
+                "🔎 <b>Обнаружена сделка на бирже</b>\n"
+                f"{pair_link} {side} @ <b>{price:,.4f}</b>\n"
+                f"Объём: {amount:.6f} (~{usd_value:.2f} USDT)\n"
+            )
             if cur_price:
-                msg_lines.append(f"Текущая цена: <b>{cur_price:,.4f}</b>")
-                msg_lines.append(f"Текущий результат: <b>{pnl_pct:+.2f}%</b>")
-            msg_lines.append("")
-            msg_lines.append("/start")
+                buf.write(
+                    f"Текущая цена: <b>{cur_price:,.4f}</b>\n"
+                    f"Текущий результат: <b>{pnl_pct:+.2f}%</b>\n"
+                )
+            buf.write("\n/start")
 
-            msg = "\n".join(msg_lines)
-            await send_telegram(msg)
+            send_telegram(buf.getvalue())
 
-    save_state()
+    mark_state_dirty()
 
 
 async def reconcile_positions(ex):
@@ -2139,12 +2566,12 @@ async def reconcile_positions(ex):
     считаем, что позиция закрыта вручную на бирже.
     """
     try:
-        balance = ex.fetch_balance()
+        balance = await fetch_balance_cached()
     except Exception as e:
         print(f"reconcile_positions: fetch_balance error: {e}")
         return
 
-    for code, symbol in COINS.items():
+    for code, symbol in COIN_ITEMS:
         pos = positions[symbol]
         if not pos["in_position"]:
             continue
@@ -2157,8 +2584,7 @@ async def reconcile_positions(ex):
         # если реальный объём на бирже меньше 10% от того, что считает бот — считаем, что позиция закрыта вручную
         if total_base + 1e-8 < pos["amount"] * 0.1:
             try:
-                ticker = ex.fetch_ticker(symbol)
-                close_price = float(ticker["last"])
+                close_price = await cached_last(symbol)
             except Exception:
                 close_price = pos["entry_price"]
 
@@ -2182,7 +2608,7 @@ async def reconcile_positions(ex):
             adaptive_on_trade(symbol, "MANUAL_EXTERNAL_CLOSE", pnl_pct)
 
             pos["in_position"] = False
-            save_state()
+            mark_state_dirty()
 
             msg = (
                 f"⚠️ <b>Позиция бота закрыта вручную на бирже</b>\n"
@@ -2192,10 +2618,10 @@ async def reconcile_positions(ex):
                 f"Оценочный P&L: <b>{pnl_pct:+.2f}%</b> | <b>${pnl_usd:+.2f}</b>\n\n"
                 f"/start"
             )
-            await send_telegram(msg)
+            send_telegram(msg)
 
 
-def generate_signal(symbol, current, df, ex, cfg=None):
+async def generate_signal(symbol, last, ex, cfg=None):
     """
     УЛУЧШЕННАЯ функция генерации сигналов с фильтрами:
     - Фильтр тренда BTC
@@ -2208,9 +2634,13 @@ def generate_signal(symbol, current, df, ex, cfg=None):
         cfg = get_symbol_config(symbol)
     now = time.time()
 
-    last = df.iloc[-1]
-    prev = df.iloc[-2]
-    current_price = last["close"]
+    # Поля свечи один раз в локальные float — дальше без обращений к dict
+    close = current_price = last["close"]
+    open_ = last["open"]
+    prev_close = last["prev_close"]
+    ema9, ema21 = last["ema9"], last["ema21"]
+    rsi = last["rsi"]
+    volume, avg_volume = last["volume"], last["avg_volume"]
 
     # Минимальный интервал между сделками
     if now - last_trade_time[symbol] < cfg["min_interval_sec"]:
@@ -2235,7 +2665,7 @@ def generate_signal(symbol, current, df, ex, cfg=None):
 
     # 3. Фильтр тренда BTC (для альткоинов)
     if cfg.get("btc_trend_filter", True) and symbol != "BTC/USDT" and not pos["in_position"]:
-        btc_trend = get_btc_trend(ex)
+        btc_trend = await get_btc_trend(ex)
         if btc_trend != "UP":
             # Не покупаем альткоины если BTC не в восходящем тренде
             return None
@@ -2248,17 +2678,17 @@ def generate_signal(symbol, current, df, ex, cfg=None):
     # === УСЛОВИЯ ПОКУПКИ (УЛУЧШЕННЫЕ) ===
     basic_buy_conditions = (
         (not pos["in_position"])
-        and last["close"] > last["ema9"] > last["ema21"]  # Тренд вверх
-        and cfg["rsi_min"] < last["rsi"] < cfg["rsi_max"]  # RSI в зоне
-        and last["volume"] > last["avg_volume"] * cfg["volume_mult"]  # Объём выше среднего
-        and last["close"] > prev["close"] * (1 + cfg["price_growth_min"])  # Рост цены
-        and last["close"] > last["open"]  # Зелёная свеча
+        and close > ema9 > ema21  # Тренд вверх
+        and cfg["rsi_min"] < rsi < cfg["rsi_max"]  # RSI в зоне
+        and volume > avg_volume * cfg["volume_mult"]  # Объём выше среднего
+        and close > prev_close * (1 + cfg["price_growth_min"])  # Рост цены
+        and close > open_  # Зелёная свеча
     )
     
     # Дополнительная проверка: подтверждение на старшем ТФ
     higher_tf_ok = True
     if cfg.get("require_higher_tf_confirm", True) and basic_buy_conditions:
-        higher_tf_ok = get_higher_timeframe_confirmation(symbol, ex)
+        higher_tf_ok = await get_higher_timeframe_confirmation(symbol, ex)
 
     basic_buy = basic_buy_conditions and higher_tf_ok
 
@@ -2278,14 +2708,14 @@ def generate_signal(symbol, current, df, ex, cfg=None):
             # Trailing Stop (если активен и сработал)
             or trailing_stop_hit
             # RSI перекупленность (но только если уже в плюсе)
-            or (last["rsi"] > 78 and current_price > pos["entry_price"])
+            or (rsi > 78 and current_price > pos["entry_price"])
             # Разворот тренда (цена сильно ниже EMA9)
-            or current_price < last["ema9"] * 0.995
+            or current_price < ema9 * 0.995
         )
     )
 
     # === РЫНОЧНЫЙ КОНТЕКСТ ===
-    market_ctx = get_market_context(symbol, current_price, cfg, ex)
+    market_ctx = await get_market_context(symbol, current_price, cfg, ex)
     
     if market_ctx is None:
         if basic_buy:
@@ -2315,8 +2745,8 @@ def generate_signal(symbol, current, df, ex, cfg=None):
     level_buy = (
         not pos["in_position"]
         and support * 0.998 <= current_price <= support * 1.002
-        and last["rsi"] > 35
-        and last["rsi"] < 55  # Не перекупленный
+        and rsi > 35
+        and rsi < 55  # Не перекупленный
         and higher_tf_ok
     )
 
@@ -2333,7 +2763,7 @@ def generate_signal(symbol, current, df, ex, cfg=None):
         and fib_382 is not None
         and atr_14 > 0
         and abs(current_price - fib_382) < atr_14 * 0.5  # Ужесточили
-        and last["close"] > last["open"]
+        and close > open_
         and higher_tf_ok
     )
 
@@ -2363,70 +2793,94 @@ def generate_signal(symbol, current, df, ex, cfg=None):
 
 
 async def trading_loop():
-    global last_price, price_initialized, last_trade_time, running
-    global day_open_price, day_open_msk_date
-    global last_price_update_time, current_prices
+    global price_initialized, last_trade_time, running
+    global day_open_msk_date
+    global last_price_update_time
 
     print("Торговый цикл запущен")
 
     try:
-        ex = get_exchange()
+        tickers = await fetch_tickers_cached(force=True)
         for sym in SYMBOLS:
-            ticker = ex.fetch_ticker(sym)
-            last_price[sym] = ticker["last"]
+            ticker = tickers[sym]
+            prices[SYMBOL_IDX[sym], PRICE_LAST] = ticker["last"]
             price_initialized[sym] = True
-            print(f"Стартовая цена {sym}: {last_price[sym]:,.4f}")
-        save_state()
+            print(f"Стартовая цена {sym}: {ticker['last']:,.4f}")
+        mark_state_dirty()
     except Exception as e:
         print(f"Ошибка инициализации: {e}")
 
     while running:
         try:
-            ex = get_exchange()
-            now_utc = datetime.now(timezone.utc)
-            now_msk = now_utc + timedelta(hours=MOSCOW_OFFSET_HOURS)
-            today_msk_str = now_msk.strftime("%Y-%m-%d")
+            aex = await get_async_exchange()
             current_time = time.time()
+            today_msk = msk_day_bucket(current_time)
 
-            for symbol in SYMBOLS:
-                if not ACTIVE_COINS.get(symbol, True):
+            # Свежий снимок тикеров на цикл — дальше его делят детектор,
+            # сверка позиций и меню
+            try:
+                await fetch_tickers_cached(force=True)
+            except Exception as e:
+                print(f"fetch_tickers error: {e}")
+
+            # Свечи по всем активным монетам — одним параллельным заходом
+            active = [s for s in SYMBOLS if ACTIVE_COINS.get(s, True)]
+            ohlcvs = await asyncio.gather(
+                *(
+                    ex_call(
+                        aex.fetch_ohlcv, s, "1m",
+                        limit=ohlcv_fetch_limit(s, current_time * 1000),
+                    )
+                    for s in active
+                ),
+                return_exceptions=True,
+            )
+
+            ohlcv_map = {}
+            for symbol, ohlcv in zip(active, ohlcvs):
+                if isinstance(ohlcv, Exception):
+                    print(f"[{symbol}] fetch_ohlcv error: {ohlcv}")
                     continue
+                ohlcv_map[symbol] = ohlcv
 
-                ohlcv = ex.fetch_ohlcv(symbol, "1m", limit=50)
-                current, df = calculate_indicators(ohlcv)
+            indicators = calculate_indicators_batch(ohlcv_map)
+            cfgs = {symbol: get_symbol_config(symbol) for symbol in indicators}
+            candidates = signal_candidates(indicators)
+
+            for symbol, current in indicators.items():
                 current_price = current["close"]
 
-                current_prices[symbol] = current_price
+                i = SYMBOL_IDX[symbol]
+                prices[i, PRICE_CURRENT] = current_price
 
-                if day_open_msk_date[symbol] != today_msk_str or day_open_price[symbol] == 0.0:
-                    day_open_price[symbol] = current_price
-                    day_open_msk_date[symbol] = today_msk_str
+                if day_open_msk_date[symbol] != today_msk or prices[i, PRICE_DAY_OPEN] == 0.0:
+                    prices[i, PRICE_DAY_OPEN] = current_price
+                    day_open_msk_date[symbol] = today_msk
                     print(
-                        f"[{symbol}] Цена открытия дня МСК {today_msk_str}: {day_open_price[symbol]:.4f}"
+                        f"[{symbol}] Цена открытия дня МСК {msk_day_str(today_msk)}: {current_price:.4f}"
                     )
-                    save_state()
+                    mark_state_dirty()
+
+                if symbol not in candidates:
+                    continue
 
-                cfg = get_symbol_config(symbol)
-                signal = generate_signal(symbol, current, df, ex, cfg)
+                cfg = cfgs[symbol]
+                signal = await generate_signal(symbol, current, aex, cfg)
                 if signal and cfg.get("auto_enabled", True):
                     last_trade_time[symbol] = current_time
-                    await execute_trade(symbol, signal, current_price, ex, cfg)
+                    await execute_trade(symbol, signal, current_price, aex, cfg)
 
             # Детектор ручных (биржевых) сделок
-            await detect_manual_trades(ex)
+            await detect_manual_trades(aex)
 
             # Сверяем позиции бота с реальным балансом на бирже
-            await reconcile_positions(ex)
+            await reconcile_positions(aex)
 
             if STRATEGY_CONFIG["notifications_enabled"]:
                 if current_time - last_price_update_time > STRATEGY_CONFIG["price_update_interval_sec"]:
-                    await send_all_price_update(current_prices)
+                    await send_all_price_update()
                     last_price_update_time = current_time
 
-            # Мониторинг памяти каждые 5 минут
-            if int(current_time) % 300 == 0:
-                log_memory_usage()
-
             await asyncio.sleep(60)
 
         except Exception as e:
@@ -2436,15 +2890,24 @@ async def trading_loop():
 
 # ================== POSITIONS MENU (ВЫХОД ИЗ СДЕЛОК) ==================
 async def show_positions_menu(message):
-    ex = get_exchange()
     lines = ["🚪 <b>Управление позициями</b>\n"]
 
-    for code, symbol in COINS.items():
+    # Маска открытых позиций один раз — для текста и для кнопок
+    open_mask = pos_arr[:, POS_IN] > 0
+    open_codes = [code for (code, _), is_open in zip(COIN_ITEMS, open_mask) if is_open]
+
+    tickers = {}
+    if open_codes:
+        try:
+            tickers = await fetch_tickers_cached(ttl=LAST_PRICE_TTL_SEC)
+        except Exception as e:
+            print(f"show_positions_menu: fetch_tickers error: {e}")
+
+    for (code, symbol), is_open in zip(COIN_ITEMS, open_mask):
         pos = positions[symbol]
-        if pos["in_position"]:
+        if is_open:
             try:
-                ticker = ex.fetch_ticker(symbol)
-                price = float(ticker["last"])
+                price = float(tickers[symbol]["last"])
             except Exception:
                 price = pos["entry_price"] or 0.0
 
@@ -2461,14 +2924,13 @@ async def show_positions_menu(message):
 
     keyboard = []
     row = []
-    for code, symbol in COINS.items():
-        if positions[symbol]["in_position"]:
-            row.append(
-                InlineKeyboardButton(f"Закрыть {code}", callback_data=f"close_{code}")
-            )
-            if len(row) == 2:
-                keyboard.append(row)
-                row = []
+    for code in open_codes:
+        row.append(
+            InlineKeyboardButton(f"Закрыть {code}", callback_data=f"close_{code}")
+        )
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
     if row:
         keyboard.append(row)
 
@@ -2502,10 +2964,14 @@ async def close_single_position(query, coin_code: str):
         return
 
     try:
-        ex = get_exchange()
-        amount_str = ex.amount_to_precision(symbol, pos["amount"])
-        order = ex.create_market_sell_order(symbol, amount_str)
-        avg_price = float(order.get("average") or ex.fetch_ticker(symbol)["last"])
+        aex = await get_async_exchange()
+        amount_str = aex.amount_to_precision(symbol, pos["amount"])
+        order = await ex_call(aex.create_market_sell_order, symbol, amount_str)
+        invalidate_balance_cache()
+        avg_price = order.get("average")
+        if not avg_price:
+            avg_price = await cached_last(symbol)
+        avg_price = float(avg_price)
         filled = float(order.get("filled", 0))
 
         if filled > 0:
@@ -2527,7 +2993,7 @@ async def close_single_position(query, coin_code: str):
             )
             adaptive_on_trade(symbol, "MANUAL_SELL", pnl_pct)
             pos["in_position"] = False
-            save_state()
+            mark_state_dirty()
 
             msg = (
                 f"✅ <b>Ручное закрытие позиции</b>\n"
@@ -2551,13 +3017,14 @@ async def close_single_position(query, coin_code: str):
 
 
 async def close_all_positions(query):
-    any_closed = False
-    for code, symbol in COINS.items():
-        if positions[symbol]["in_position"]:
-            await close_single_position(query, code)
-            any_closed = True
+    open_codes = [code for code, symbol in COIN_ITEMS if positions[symbol]["in_position"]]
+    # Монеты независимы — закрываем параллельно, а не по очереди
+    await asyncio.gather(
+        *(close_single_position(query, code) for code in open_codes),
+        return_exceptions=True,
+    )
 
-    if not any_closed:
+    if not open_codes:
         await query.message.reply_text(
             "Нет открытых позиций по всем монетам.",
             reply_markup=with_start_button(),
@@ -2611,11 +3078,11 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await start_from_callback(update, context)
     elif data == "positions_menu":
         await show_positions_menu(query.message)
+    elif data == "close_all":
+        await close_all_positions(query)
     elif data.startswith("close_"):
         code = data.split("_", 1)[1]
         await close_single_position(query, code)
-    elif data == "close_all":
-        await close_all_positions(query)
     elif data.startswith(("set_", "toggle_coin_", "dep_")):
         await handle_settings_change(query, context)
 
@@ -2625,6 +3092,7 @@ def signal_handler(sig, frame):
     global running
     print("Останавливаем бота...")
     running = False
+    flush_state()
 
 
 async def main():
@@ -2633,11 +3101,13 @@ async def main():
     signal.signal(signal.SIGTERM, signal_handler)
 
     check_env()
+    tg_task = asyncio.create_task(_tg_worker())
     init_db()
     migrate_csv_to_db()
     load_state()
     init_adaptive_state()
-    await send_telegram("✅ <b>Торговый бот запущен!</b>\n/start для управления")
+    prewarm_indicator_caches()
+    send_telegram("✅ <b>Торговый бот запущен!</b>\n/start для управления")
     print("Стартовое сообщение отправлено")
 
     app = Application.builder().token(TELEGRAM_TOKEN).build()
@@ -2651,15 +3121,24 @@ async def main():
     await app.updater.start_polling()
 
     trading_task = asyncio.create_task(trading_loop())
+    flusher_task = asyncio.create_task(_state_flusher())
+    memory_task = asyncio.create_task(periodic(log_memory_usage, MEMORY_LOG_INTERVAL_SEC))
 
     print("Бот полностью запущен. Для остановки Ctrl+C")
     while running:
         await asyncio.sleep(1)
 
     trading_task.cancel()
+    flusher_task.cancel()
+    memory_task.cancel()
+    await flush_telegram_queue()
+    tg_task.cancel()
+    await close_tg_bot()
+    flush_state()
     await app.updater.stop()
     await app.stop()
     await app.shutdown()
+    await close_async_exchange()
     print("Бот остановлен")
 
 
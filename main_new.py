@@ -24,6 +24,7 @@ logger.add(
 
 from src.config import SCAN_INTERVALS, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID
 from src.database.connection import init_db
+from src.database.daily_stats import daily_stats
 from src.exchange import BybitExchange, MarketScanner
 from src.telegram import TelegramBot, setup_handlers
 from src.telegram.handlers import set_components
@@ -149,6 +150,7 @@ async def main():
     # 1. Инициализация БД
     logger.info("📦 Инициализация базы данных...")
     init_db()
+    await daily_stats.load()
     
     # 2. Подключение к бирже
     logger.info("🔗 Подключение к Bybit...")
@@ -247,6 +249,9 @@ async def main():
     await app.stop()
     await app.shutdown()
     
+    # Дописываем дневную статистику
+    await daily_stats.flush()
+    
     # Закрываем биржу
     await exchange.close()
     
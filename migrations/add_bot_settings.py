@@ -1,16 +1,20 @@
 """
 Миграция: добавление таблицы bot_settings для хранения настроек бота
 """
+import sys
+from pathlib import Path
+
 from sqlalchemy import create_engine, text
 from loguru import logger
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+# Запуск как `python migrations/...py`: корень репозитория в sys.path для src.config
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import DATABASE_URL
+
 
 def run_migration():
     """Создаёт таблицу bot_settings"""
-    DATABASE_URL = os.getenv("DATABASE_URL")
     engine = create_engine(DATABASE_URL)
     
     logger.info("🔄 Начинаем миграцию: добавление таблицы bot_settings")
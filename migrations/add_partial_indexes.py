@@ -0,0 +1,40 @@
+"""
+Миграция: частичные индексы по открытым позициям и ожидающим сигналам
+"""
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from loguru import logger
+
+# Запуск как `python migrations/...py`: корень репозитория в sys.path для src.config
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import DATABASE_URL
+
+
+def run_migration():
+    """Создаёт idx_position_open и idx_signal_pending"""
+    engine = create_engine(DATABASE_URL)
+    
+    logger.info("🔄 Начинаем миграцию: частичные индексы positions/signals")
+    
+    with engine.connect() as conn:
+        # SQLAlchemy Enum хранит имена членов (OPEN, PENDING, ...)
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_position_open ON positions(symbol)
+            WHERE status IN ('OPEN', 'PARTIAL_TP1', 'PARTIAL_TP2')
+        """))
+        
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_signal_pending ON signals(created_at)
+            WHERE status = 'PENDING'
+        """))
+        
+        conn.commit()
+        logger.info("✅ Индексы созданы")
+    
+    logger.info("✅ Миграция завершена успешно")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,45 @@
+"""
+Миграция: время вставки строк проставляет PostgreSQL (server_default)
+"""
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from loguru import logger
+
+# Запуск как `python migrations/...py`: корень репозитория в sys.path для src.config
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import DATABASE_URL
+
+# (таблица, колонка)
+COLUMNS = [
+    ("signals", "created_at"),
+    ("positions", "entry_time"),
+    ("trades", "created_at"),
+    ("daily_stats", "updated_at"),
+    ("bot_settings", "updated_at"),
+    ("holdings", "updated_at"),
+]
+
+
+def run_migration():
+    """Ставит DEFAULT (now() at time zone 'utc') на колонки времени"""
+    engine = create_engine(DATABASE_URL)
+    
+    logger.info("🔄 Начинаем миграцию: server_default для колонок времени")
+    
+    with engine.connect() as conn:
+        for table, column in COLUMNS:
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} "
+                f"SET DEFAULT (now() at time zone 'utc')"
+            ))
+        
+        conn.commit()
+        logger.info("✅ Значения по умолчанию установлены")
+    
+    logger.info("✅ Миграция завершена успешно")
+
+if __name__ == "__main__":
+    run_migration()
@@ -1,8 +1,19 @@
-from .connection import engine, SessionLocal, get_db, init_db
-from .models import Base, Signal, Trade, Position, DailyStats, SignalCooldown, BotSettings, Holding, SignalStatus, PositionStatus
+from .connection import get_engine, get_session_factory, get_db, init_db
+from .models import Base, Signal, Trade, Position, DailyStats, SignalCooldown, BotSettings, Holding, SignalStatus, PositionStatus, OPEN_POSITION_STATUSES
+from .daily_stats import daily_stats
+from .cooldowns import is_cooldown, set_cooldown, load_cooldowns, without_cooldown
 
 __all__ = [
-    "engine", "SessionLocal", "get_db", "init_db",
+    "engine", "SessionLocal", "get_engine", "get_session_factory", "get_db", "init_db",
     "Base", "Signal", "Trade", "Position", "DailyStats", "SignalCooldown", "BotSettings", "Holding",
-    "SignalStatus", "PositionStatus"
+    "SignalStatus", "PositionStatus", "OPEN_POSITION_STATUSES", "daily_stats",
+    "is_cooldown", "set_cooldown", "load_cooldowns", "without_cooldown",
 ]
+
+
+def __getattr__(name):
+    # engine / SessionLocal создаются лениво в connection.py
+    if name in ("engine", "SessionLocal"):
+        from . import connection
+        return getattr(connection, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
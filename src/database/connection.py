@@ -1,46 +1,94 @@
 """
 Подключение к PostgreSQL через SQLAlchemy
 """
+from functools import lru_cache
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
-from contextlib import contextmanager
 
 from src.config import DATABASE_URL
 
-# Создаём движок
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_pre_ping=True,  # Проверка соединения перед использованием
-    echo=False,
-)
 
-# Фабрика сессий
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _sqlalchemy_url(url: str) -> str:
+    """
+    DATABASE_URL в формате libpq (его же читают скрипты через psycopg2)
+    переводим на драйвер psycopg 3 для SQLAlchemy.
+    """
+    for prefix in ("postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+@lru_cache(maxsize=1)
+def get_engine():
+    """Движок создаётся при первом обращении к БД, а не при импорте модуля"""
+    return create_engine(
+        _sqlalchemy_url(DATABASE_URL),
+        pool_size=5,
+        max_overflow=10,
+        pool_pre_ping=True,  # Проверка соединения перед использованием
+        pool_recycle=1800,
+        # Серверный prepared statement со второго выполнения запроса
+        connect_args={"prepare_threshold": 1},
+        echo=False,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_session_factory():
+    """Фабрика сессий поверх get_engine()"""
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+def __getattr__(name):
+    # Совместимость со старыми импортами `engine` / `SessionLocal`
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _DbCtx:
+    """
+    Контекст сессии без генератора: __enter__/__exit__ вызываются напрямую,
+    __slots__ — без словаря атрибутов на каждый вызов get_db().
+    """
+    __slots__ = ("session",)
+
+    def __enter__(self) -> Session:
+        self.session = get_session_factory()()
+        return self.session
+
+    def __exit__(self, exc_type, exc, tb):
+        session = self.session
+        try:
+            if exc_type is None:
+                try:
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    raise
+            else:
+                session.rollback()
+        finally:
+            session.close()
+        return False
 
 
-@contextmanager
-def get_db() -> Session:
+def get_db() -> _DbCtx:
     """
     Контекстный менеджер для работы с БД.
     Использование:
         with get_db() as db:
             db.query(...)
     """
-    db = SessionLocal()
-    try:
-        yield db
-        db.commit()
-    except Exception:
-        db.rollback()
-        raise
-    finally:
-        db.close()
+    return _DbCtx()
 
 
 def init_db():
     """Создаёт все таблицы в БД"""
     from .models import Base
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
     print("✅ База данных инициализирована")
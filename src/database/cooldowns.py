@@ -0,0 +1,80 @@
+"""
+Кулдауны сигналов в памяти процесса.
+Проверка идёт на каждую пару каждого скана — держим срок окончания
+кулдауна в словаре, а таблица signal_cooldowns нужна только чтобы
+пережить перезапуск (читается один раз, пишется при новом сигнале).
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from loguru import logger
+
+from src.config import ANTI_FOMO
+from .connection import get_db
+from .models import SignalCooldown
+
+# symbol → time.time(), до которого сигналы по паре не отправляем
+_cooldown_until: Dict[str, float] = {}
+_loaded = False
+_load_lock = asyncio.Lock()
+
+
+def _cooldown_sec() -> float:
+    return ANTI_FOMO["signal_cooldown_hours"] * 3600
+
+
+def _load_sync() -> Dict[str, float]:
+    result = {}
+    with get_db() as db:
+        for symbol, last_signal_at in db.query(
+            SignalCooldown.symbol, SignalCooldown.last_signal_at
+        ):
+            if last_signal_at.tzinfo is None:
+                last_signal_at = last_signal_at.replace(tzinfo=timezone.utc)
+            result[symbol] = last_signal_at.timestamp() + _cooldown_sec()
+    return result
+
+
+async def load_cooldowns():
+    """Подтягивает кулдауны из signal_cooldowns (до первой успешной загрузки)"""
+    global _loaded
+    if _loaded:
+        return
+    async with _load_lock:
+        if _loaded:
+            return
+        try:
+            loaded = await asyncio.to_thread(_load_sync)
+        except Exception as e:
+            # _loaded не ставим — следующая проверка повторит загрузку
+            logger.error(f"Ошибка загрузки кулдаунов: {e}")
+            return
+        # Кулдауны, выставленные до загрузки, свежее записей из БД
+        for symbol, until in loaded.items():
+            if until > _cooldown_until.get(symbol, 0.0):
+                _cooldown_until[symbol] = until
+        _loaded = True
+
+
+async def is_cooldown(symbol: str) -> bool:
+    """True, если по паре ещё действует кулдаун"""
+    if not _loaded:
+        await load_cooldowns()
+    return _cooldown_until.get(symbol, 0.0) > time.time()
+
+
+async def without_cooldown(symbols: List[str]) -> List[str]:
+    """Пары без действующего кулдауна — одной проверкой на весь скан"""
+    if not _loaded:
+        await load_cooldowns()
+    now = time.time()
+    until = _cooldown_until
+    return [symbol for symbol in symbols if until.get(symbol, 0.0) <= now]
+
+
+def set_cooldown(symbol: str, at: datetime = None):
+    """Запускает кулдаун пары (запись в БД — вместе с сигналом)"""
+    ts = at.timestamp() if at else time.time()
+    _cooldown_until[symbol] = ts + _cooldown_sec()
@@ -0,0 +1,165 @@
+"""
+Дневная статистика в памяти процесса.
+Счётчики DailyStats меняются на каждом сигнале/сделке — вместо
+read-modify-write в PostgreSQL копим их здесь и сбрасываем upsert'ом
+не чаще раза в DAILY_STATS_FLUSH_SEC.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from loguru import logger
+from sqlalchemy.dialects.postgresql import insert
+
+from .connection import get_db
+from .models import DailyStats, UTC_NOW
+
+DAILY_STATS_FLUSH_SEC = 5.0
+
+_COUNTER_FIELDS = (
+    "signals_sent", "signals_accepted", "signals_rejected",
+    "trades_won", "trades_lost", "total_pnl_usdt",
+    "stop_losses_today", "trading_paused",
+)
+
+
+def _utc_today() -> datetime:
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _empty_counters() -> Dict:
+    return {
+        "signals_sent": 0,
+        "signals_accepted": 0,
+        "signals_rejected": 0,
+        "trades_won": 0,
+        "trades_lost": 0,
+        "total_pnl_usdt": 0.0,
+        "stop_losses_today": 0,
+        "trading_paused": False,
+    }
+
+
+class DailyStatsAggregator:
+    """Счётчики текущих суток (UTC) + отложенный сброс в daily_stats"""
+
+    def __init__(self, flush_sec: float = DAILY_STATS_FLUSH_SEC):
+        self.flush_sec = flush_sec
+        self.date = _utc_today()
+        self.counters = _empty_counters()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Растёт на каждом изменении: флашер видит правки во время записи
+        self._version = 0
+
+    # ----- загрузка -----
+
+    def _load_sync(self, date: datetime) -> Dict:
+        counters = _empty_counters()
+        with get_db() as db:
+            row = db.query(DailyStats).filter(DailyStats.date == date).first()
+            if row:
+                for field in _COUNTER_FIELDS:
+                    value = getattr(row, field)
+                    if value is not None:
+                        counters[field] = value
+        return counters
+
+    async def load(self):
+        """Подтягивает сегодняшнюю строку daily_stats при старте"""
+        self.date = _utc_today()
+        try:
+            self.counters = await asyncio.to_thread(self._load_sync, self.date)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки дневной статистики: {e}")
+
+    # ----- изменение -----
+
+    def _roll_day(self):
+        """Смена суток: старые счётчики дописываем в БД и начинаем с нуля"""
+        today = _utc_today()
+        if today == self.date:
+            return
+        prev_date, prev = self.date, self.counters
+        self.date = today
+        self.counters = _empty_counters()
+        if self._spawn(self._flush_values(prev_date, prev)) is None:
+            self._upsert_sync(prev_date, prev)
+
+    def increment(self, field: str, n=1):
+        self._roll_day()
+        self.counters[field] += n
+        self._version += 1
+        self._schedule_flush()
+
+    def set(self, field: str, value):
+        self._roll_day()
+        self.counters[field] = value
+        self._version += 1
+        self._schedule_flush()
+
+    def get(self, field: str):
+        self._roll_day()
+        return self.counters[field]
+
+    def snapshot(self) -> Dict:
+        self._roll_day()
+        return dict(self.counters)
+
+    # ----- сброс в БД -----
+
+    def _spawn(self, coro):
+        try:
+            return asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            # Вне event loop (скрипты) — пишем синхронно
+            coro.close()
+            return None
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._spawn(self._debounced_flush())
+            if self._flush_task is None:
+                self._upsert_sync(self.date, dict(self.counters))
+
+    async def _debounced_flush(self):
+        # Изменения, пришедшие во время записи, и неудачную запись
+        # сбрасываем следующим кругом
+        while True:
+            await asyncio.sleep(self.flush_sec)
+            version = self._version
+            ok = await self._flush_values(self.date, dict(self.counters))
+            if ok and version == self._version:
+                return
+
+    async def _flush_values(self, date: datetime, values: Dict) -> bool:
+        try:
+            await asyncio.to_thread(self._upsert_sync, date, values)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения дневной статистики: {e}")
+            return False
+
+    @staticmethod
+    def _upsert_sync(date: datetime, values: Dict):
+        stmt = insert(DailyStats).values(date=date, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DailyStats.date],
+            set_={**values, "updated_at": UTC_NOW},
+        )
+        with get_db() as db:
+            db.execute(stmt)
+
+    async def flush(self):
+        """Немедленный сброс (при остановке бота)"""
+        task = self._flush_task
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self._flush_values(self.date, dict(self.counters))
+
+
+daily_stats = DailyStatsAggregator()
@@ -4,13 +4,16 @@ SQLAlchemy модели для PostgreSQL
 from datetime import datetime
 from sqlalchemy import (
     Column, Integer, String, Float, Boolean, DateTime, 
-    Text, Enum, ForeignKey, Index
+    Text, Enum, ForeignKey, Index, text
 )
 from sqlalchemy.orm import declarative_base, relationship
 import enum
 
 Base = declarative_base()
 
+# Время вставки проставляет PostgreSQL (naive UTC, как раньше datetime.utcnow)
+UTC_NOW = text("(now() at time zone 'utc')")
+
 
 class SignalStatus(enum.Enum):
     """Статусы сигнала"""
@@ -31,6 +34,24 @@ class PositionStatus(enum.Enum):
     CLOSED_MANUAL = "closed_manual"  # Закрыта вручную
 
 
+# Статусы «живой» позиции — по ним фильтруют сканер, менеджер позиций и UI
+OPEN_POSITION_STATUSES = (
+    PositionStatus.OPEN,
+    PositionStatus.PARTIAL_TP1,
+    PositionStatus.PARTIAL_TP2,
+)
+
+
+# Нативные ENUM-типы PostgreSQL (4 байта на значение, а не VARCHAR).
+# Имена совпадают с теми, что SQLAlchemy уже создал по умолчанию в существующих БД.
+signal_status_enum = Enum(
+    SignalStatus, name="signalstatus", native_enum=True, validate_strings=True
+)
+position_status_enum = Enum(
+    PositionStatus, name="positionstatus", native_enum=True, validate_strings=True
+)
+
+
 class Signal(Base):
     """Сигналы на покупку"""
     __tablename__ = "signals"
@@ -65,8 +86,8 @@ class Signal(Base):
     accumulation_range = Column(Float)       # Диапазон накопления
     
     # Статус и время
-    status = Column(Enum(SignalStatus), default=SignalStatus.PENDING)
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    status = Column(signal_status_enum, default=SignalStatus.PENDING)
+    created_at = Column(DateTime, server_default=UTC_NOW, index=True)
     decided_at = Column(DateTime, nullable=True)
     
     # Telegram
@@ -77,6 +98,11 @@ class Signal(Base):
     
     __table_args__ = (
         Index("idx_signal_symbol_created", "symbol", "created_at"),
+        # Частичный индекс: ожидающих сигналов единицы, а таблица растёт
+        Index(
+            "idx_signal_pending", "created_at",
+            postgresql_where=(status == SignalStatus.PENDING),
+        ),
     )
 
 
@@ -95,7 +121,7 @@ class Position(Base):
     entry_price = Column(Float, nullable=False)
     entry_amount = Column(Float, nullable=False)      # Количество монет
     entry_value_usdt = Column(Float, nullable=False)  # В USDT
-    entry_time = Column(DateTime, default=datetime.utcnow)
+    entry_time = Column(DateTime, server_default=UTC_NOW)
     
     # Текущее состояние
     current_amount = Column(Float)            # Оставшееся количество
@@ -109,7 +135,7 @@ class Position(Base):
     max_price = Column(Float, nullable=True)  # Максимальная цена
     
     # Статус
-    status = Column(Enum(PositionStatus), default=PositionStatus.OPEN)
+    status = Column(position_status_enum, default=PositionStatus.OPEN)
     closed_at = Column(DateTime, nullable=True)
     close_price = Column(Float, nullable=True)
     close_reason = Column(String(50), nullable=True)
@@ -125,6 +151,11 @@ class Position(Base):
     __table_args__ = (
         Index("idx_position_status", "status"),
         Index("idx_position_symbol", "symbol"),
+        # Частичный индекс только по открытым позициям
+        Index(
+            "idx_position_open", "symbol",
+            postgresql_where=status.in_(OPEN_POSITION_STATUSES),
+        ),
     )
 
 
@@ -159,7 +190,7 @@ class Trade(Base):
     reason = Column(String(50))  # SIGNAL, TP1, TP2, TP3, SL, MANUAL
     
     # Время
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, server_default=UTC_NOW, index=True)
     
     # Связь
     position = relationship("Position", back_populates="trades")
@@ -187,7 +218,7 @@ class DailyStats(Base):
     trading_paused = Column(Boolean, default=False)
     
     # Обновление
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, server_default=UTC_NOW, onupdate=datetime.utcnow)
 
 
 class SignalCooldown(Base):
@@ -206,7 +237,7 @@ class BotSettings(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     key = Column(String(50), nullable=False, unique=True, index=True)
     value = Column(String(200), nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, server_default=UTC_NOW, onupdate=datetime.utcnow)
 
 
 class Holding(Base):
@@ -219,4 +250,4 @@ class Holding(Base):
     avg_entry_price = Column(Float, nullable=False, default=0.0)
     last_price = Column(Float, nullable=True)
     last_value_usdt = Column(Float, nullable=True)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, server_default=UTC_NOW, onupdate=datetime.utcnow)
@@ -2,10 +2,14 @@
 Подключение к Bybit через pybit + ccxt
 """
 import asyncio
+import re
+import time
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timezone
+import aiohttp
+import numpy as np
+import orjson
 from loguru import logger
-from pybit.unified_trading import HTTP
+from pybit.unified_trading import HTTP, WebSocket
 import ccxt.async_support as ccxt
 
 from src.config import (
@@ -13,10 +17,56 @@ from src.config import (
     ASSET_FILTERS, TIMEFRAMES
 )
 
+# Фильтры пар — константы модуля, чтобы не искать их в словаре на каждом тикере
+_EXCLUDED_BASES = frozenset(ASSET_FILTERS["excluded_bases"])
+# Пара .../USDT с неисключённой базой — одна проверка регуляркой
+_SYMBOL_RE = re.compile(
+    r"^(?!(?:" + "|".join(map(re.escape, sorted(_EXCLUDED_BASES))) + r")/)[^/]+/USDT$"
+)
+_MIN_PRICE = float(ASSET_FILTERS["min_price"])
+_MAX_PRICE = float(ASSET_FILTERS["max_price"])
+_MIN_VOLUME_24H = float(ASSET_FILTERS["min_volume_24h"])
+
+SYMBOLS_CACHE_TTL_SEC = 300
+# Таймфреймы конфига ("5") → формат ccxt ("5m")
+_TF_MAP = {"1": "1m", "5": "5m", "15": "15m", "60": "1h", "1440": "1d"}
+
+BYBIT_REST_URL = "https://api.bybit.com"
+BYBIT_TESTNET_REST_URL = "https://api-testnet.bybit.com"
+
+OHLCV_MAX_CONCURRENCY = 10  # Одновременных запросов свечей в get_ohlcv_many
+OHLCV_TAIL_LIMIT = 3  # Свечей на дозагрузку окна из кэша (с перекрытием)
+
+BTC_WS_SYMBOL = "BTCUSDT"
+BTC_WS_INTERVAL = 60
+BTC_WS_STALE_SEC = 300  # Без сообщений дольше — считаем поток мёртвым и идём в REST
+BTC_CHANGE_TTL_SEC = 30  # Кэш REST-фолбэка get_btc_change_1h
+
+
+class _BybitClient(ccxt.bybit):
+    """
+    ccxt.bybit с разбором ответов через orjson: fetch_tickers отдаёт ~1 МБ JSON.
+    Числовые поля Bybit приходят строками, так что точность та же, что у json.
+    """
+    
+    def parse_json(self, http_response):
+        try:
+            return orjson.loads(http_response)
+        except orjson.JSONDecodeError:
+            # Не-JSON (HTML ошибки и т.п.) — как обрабатывает сам ccxt
+            return super().parse_json(http_response)
+
 
 class BybitExchange:
     """Класс для работы с биржей Bybit"""
     
+    __slots__ = (
+        "api_key", "secret", "testnet", "client", "ccxt",
+        "_symbols_cache", "_cache_expiry", "_ohlcv_sem", "_session",
+        "_btc_ws", "_btc_kline", "_btc_change", "_btc_change_expiry",
+        "_spot_ids", "_ohlcv_windows",
+    )
+    
     def __init__(self):
         self.api_key = BYBIT_API_KEY
         self.secret = BYBIT_SECRET
@@ -28,9 +78,28 @@ class BybitExchange:
         # ccxt для свечей и универсальных методов
         self.ccxt: Optional[ccxt.bybit] = None
         
+        # Общая HTTP-сессия ccxt: keep-alive пул вместо TLS-рукопожатий на запрос
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # id спотового рынка Bybit ("SOLUSDT") → символ ccxt ("SOL/USDT")
+        self._spot_ids: Dict[str, str] = {}
+        
         # Кэш
         self._symbols_cache: List[str] = []
-        self._cache_time: Optional[datetime] = None
+        self._cache_expiry: float = 0.0  # time.monotonic(), до которого кэш свежий
+        
+        # Ограничение параллельных запросов свечей
+        self._ohlcv_sem = asyncio.Semaphore(OHLCV_MAX_CONCURRENCY)
+        
+        # Последнее окно свечей по (symbol, timeframe) — для дозагрузки хвоста
+        self._ohlcv_windows: Dict[tuple, List[List]] = {}
+        
+        # Часовые свечи BTC из WebSocket: (start_ms, prev_close, curr_close, monotonic ts).
+        # Кортеж заменяется целиком — поток pybit и event loop не видят полузаписи
+        self._btc_ws: Optional[WebSocket] = None
+        self._btc_kline: Optional[tuple] = None
+        self._btc_change: float = 0.0
+        self._btc_change_expiry: float = 0.0
         
     async def connect(self):
         """Инициализация подключений"""
@@ -48,10 +117,19 @@ class BybitExchange:
                 raise Exception(f"pybit error: {test}")
             
             # ccxt
-            self.ccxt = ccxt.bybit({
+            connector = aiohttp.TCPConnector(
+                limit=50,
+                limit_per_host=20,
+                keepalive_timeout=75,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=True)
+            self.ccxt = _BybitClient({
                 'apiKey': self.api_key,
                 'secret': self.secret,
                 'enableRateLimit': True,
+                'session': self._session,
                 'options': {
                     'defaultType': 'spot',
                 }
@@ -61,6 +139,12 @@ class BybitExchange:
                 self.ccxt.set_sandbox_mode(True)
                 
             await self.ccxt.load_markets()
+            self._spot_ids = {
+                m['id']: m['symbol']
+                for m in self.ccxt.markets.values() if m.get('spot')
+            }
+            
+            await self._start_btc_ws()
             
             logger.info(f"✅ Подключение к Bybit {'TESTNET' if self.testnet else 'MAINNET'}")
             return True
@@ -69,11 +153,89 @@ class BybitExchange:
             logger.error(f"❌ Ошибка подключения к Bybit: {e}")
             return False
     
+    async def _start_btc_ws(self):
+        """Подписка на kline.60.BTCUSDT; два последних закрытия засеваем из REST"""
+        try:
+            ohlcv = await self.get_ohlcv("BTC/USDT", "60", limit=2)
+            if len(ohlcv) >= 2:
+                self._btc_kline = (
+                    ohlcv[-1][0], ohlcv[-2][4], ohlcv[-1][4], time.monotonic()
+                )
+            
+            self._btc_ws = WebSocket(testnet=self.testnet, channel_type="spot")
+            self._btc_ws.kline_stream(
+                interval=BTC_WS_INTERVAL,
+                symbol=BTC_WS_SYMBOL,
+                callback=self._on_btc_kline,
+            )
+        except Exception as e:
+            logger.error(f"Ошибка подписки на BTC kline: {e}")
+    
+    def _on_btc_kline(self, message: Dict):
+        """Колбэк pybit (вызывается из его потока)"""
+        for bar in message.get("data", ()):
+            start = int(bar["start"])
+            close = float(bar["close"])
+            state = self._btc_kline
+            if state is None:
+                self._btc_kline = (start, close, close, time.monotonic())
+            elif start == state[0]:
+                self._btc_kline = (start, state[1], close, time.monotonic())
+            elif start > state[0]:
+                # Новый час: текущее закрытие становится предыдущим
+                self._btc_kline = (start, state[2], close, time.monotonic())
+    
     async def close(self):
         """Закрытие соединений"""
+        if self._btc_ws:
+            try:
+                self._btc_ws.exit()
+            except Exception:
+                pass
+            self._btc_ws = None
         if self.ccxt:
             await self.ccxt.close()
+        # Сессию передали в ccxt снаружи — он её не закрывает
+        if self._session:
+            await self._session.close()
+            self._session = None
             
+    async def _raw_fetch_tickers(self) -> List[tuple]:
+        """
+        Спотовые тикеры напрямую из /v5/market/tickers: [(symbol, last, turnover24h)].
+        Без нормализации ccxt — на ~600 пар это заметно дешевле fetch_tickers.
+        """
+        base = BYBIT_TESTNET_REST_URL if self.testnet else BYBIT_REST_URL
+        async with self._session.get(
+            f"{base}/v5/market/tickers",
+            params={"category": "spot"},
+            timeout=aiohttp.ClientTimeout(total=10),
+        ) as resp:
+            resp.raise_for_status()
+            data = orjson.loads(await resp.read())
+        if data.get("retCode") != 0:
+            raise Exception(f"Bybit tickers error: {data.get('retMsg')}")
+        
+        spot_ids = self._spot_ids
+        result = []
+        for t in data["result"]["list"]:
+            symbol = spot_ids.get(t["symbol"])
+            if symbol is not None:
+                result.append((symbol, t.get("lastPrice"), t.get("turnover24h")))
+        return result
+    
+    async def _fetch_ticker_rows(self) -> List[tuple]:
+        """Сырые тикеры, при ошибке — через ccxt в том же формате"""
+        try:
+            return await self._raw_fetch_tickers()
+        except Exception as e:
+            logger.warning(f"Прямой запрос тикеров не удался, используем ccxt: {e}")
+        tickers = await self.ccxt.fetch_tickers()
+        return [
+            (symbol, t.get('last') or t.get('close'), t.get('quoteVolume'))
+            for symbol, t in tickers.items()
+        ]
+    
     async def get_tradeable_symbols(self, force_refresh: bool = False) -> List[str]:
         """
         Получает список торгуемых пар по фильтрам:
@@ -82,43 +244,46 @@ class BybitExchange:
         - Исключает BTC, ETH, stables
         """
         # Проверяем кэш (5 минут)
-        if not force_refresh and self._symbols_cache and self._cache_time:
-            age = (datetime.now(timezone.utc) - self._cache_time).total_seconds()
-            if age < 300:
-                return self._symbols_cache
+        if (
+            not force_refresh
+            and self._symbols_cache
+            and time.monotonic() < self._cache_expiry
+        ):
+            return self._symbols_cache
         
         try:
             # Получаем все SPOT тикеры
-            tickers = await self.ccxt.fetch_tickers()
+            rows = await self._fetch_ticker_rows()
             
-            valid_symbols = []
+            # Только USDT пары без исключённых баз
+            match = _SYMBOL_RE.match
+            items = [row for row in rows if match(row[0])]
             
-            for symbol, ticker in tickers.items():
-                # Только USDT пары
-                if not symbol.endswith('/USDT'):
-                    continue
-                
-                base = symbol.split('/')[0]
-                
-                # Исключаем
-                if base in ASSET_FILTERS["excluded_bases"]:
-                    continue
-                
-                # Проверяем цену
-                price = ticker.get('last') or ticker.get('close') or 0
-                if not (ASSET_FILTERS["min_price"] <= price <= ASSET_FILTERS["max_price"]):
-                    continue
-                
-                # Проверяем объём
-                quote_volume = ticker.get('quoteVolume') or 0
-                if quote_volume < ASSET_FILTERS["min_volume_24h"]:
-                    continue
-                
-                valid_symbols.append(symbol)
+            # Цена и объём — одной маской numpy по всем парам
+            n = len(items)
+            prices = np.fromiter(
+                (float(price or 0) for _, price, _ in items),
+                dtype=np.float64, count=n,
+            )
+            volumes = np.fromiter(
+                (float(volume or 0) for _, _, volume in items),
+                dtype=np.float64, count=n,
+            )
+            mask = (
+                (prices >= _MIN_PRICE)
+                & (prices <= _MAX_PRICE)
+                & (volumes >= _MIN_VOLUME_24H)
+            )
+            valid_symbols = [items[i][0] for i in np.flatnonzero(mask)]
             
             # Обновляем кэш
             self._symbols_cache = valid_symbols
-            self._cache_time = datetime.now(timezone.utc)
+            self._cache_expiry = time.monotonic() + SYMBOLS_CACHE_TTL_SEC
+            
+            # Окна свечей выбывших из списка пар больше не понадобятся
+            universe = set(valid_symbols)
+            for key in [k for k in self._ohlcv_windows if k[0] not in universe]:
+                del self._ohlcv_windows[key]
             
             logger.info(f"📊 Найдено {len(valid_symbols)} подходящих пар")
             return valid_symbols
@@ -138,9 +303,7 @@ class BybitExchange:
         Формат: [[timestamp, open, high, low, close, volume], ...]
         """
         try:
-            # Маппинг таймфреймов
-            tf_map = {"1": "1m", "5": "5m", "15": "15m", "60": "1h"}
-            tf = tf_map.get(timeframe, timeframe)
+            tf = _TF_MAP.get(timeframe, timeframe)
             
             ohlcv = await self.ccxt.fetch_ohlcv(symbol, tf, limit=limit)
             return ohlcv
@@ -149,6 +312,59 @@ class BybitExchange:
             logger.error(f"Ошибка получения свечей {symbol}: {e}")
             return []
     
+    async def get_ohlcv_window(
+        self,
+        symbol: str,
+        timeframe: str = "5m",
+        limit: int = 100
+    ) -> List[List]:
+        """
+        Окно из limit последних свечей с дозагрузкой: если окно пары уже
+        в кэше, запрашиваются только OHLCV_TAIL_LIMIT последних свечей и
+        склеиваются с ним. Полный запрос — при промахе кэша или разрыве
+        (хвост не перекрывается с окном). Результат тот же, что у get_ohlcv.
+        """
+        key = (symbol, timeframe)
+        window = self._ohlcv_windows.get(key)
+        if window and len(window) >= limit:
+            tail = await self.get_ohlcv(symbol, timeframe, OHLCV_TAIL_LIMIT)
+            if tail and tail[0][0] <= window[-1][0]:
+                start = tail[0][0]
+                keep = len(window)
+                while keep and window[keep - 1][0] >= start:
+                    keep -= 1
+                window = (window[:keep] + tail)[-limit:]
+                self._ohlcv_windows[key] = window
+                return window
+        
+        window = await self.get_ohlcv(symbol, timeframe, limit)
+        if window:
+            self._ohlcv_windows[key] = window
+        else:
+            self._ohlcv_windows.pop(key, None)
+        return window
+    
+    async def get_ohlcv_many(
+        self,
+        symbols: List[str],
+        timeframe: str = "5m",
+        limit: int = 100,
+        incremental: bool = False
+    ) -> Dict[str, List[List]]:
+        """
+        Свечи по нескольким парам параллельно (не более OHLCV_MAX_CONCURRENCY
+        запросов одновременно). Ошибка по паре даёт пустой список, как в get_ohlcv.
+        incremental — окна через get_ohlcv_window (дозагрузка хвоста).
+        """
+        fetch = self.get_ohlcv_window if incremental else self.get_ohlcv
+        
+        async def _one(symbol: str):
+            async with self._ohlcv_sem:
+                return symbol, await fetch(symbol, timeframe, limit)
+        
+        results = await asyncio.gather(*(_one(s) for s in symbols))
+        return dict(results)
+    
     async def get_ticker(self, symbol: str) -> Optional[Dict]:
         """Получает текущий тикер"""
         try:
@@ -158,6 +374,21 @@ class BybitExchange:
             logger.error(f"Ошибка тикера {symbol}: {e}")
             return None
     
+    async def get_tickers(self) -> Dict[str, Dict]:
+        """
+        Все спотовые тикеры одним запросом: symbol → {last, quoteVolume}.
+        Для скана — вместо get_ticker по каждой паре.
+        """
+        try:
+            rows = await self._fetch_ticker_rows()
+        except Exception as e:
+            logger.error(f"Ошибка получения тикеров: {e}")
+            return {}
+        return {
+            symbol: {"symbol": symbol, "last": last, "quoteVolume": turnover}
+            for symbol, last, turnover in rows
+        }
+    
     async def get_orderbook(self, symbol: str, limit: int = 5) -> Optional[Dict]:
         """Получает стакан заявок"""
         try:
@@ -236,12 +467,23 @@ class BybitExchange:
     
     async def get_btc_change_1h(self) -> float:
         """Получает изменение BTC за 1 час (для фильтра)"""
+        state = self._btc_kline
+        if state is not None and time.monotonic() - state[3] < BTC_WS_STALE_SEC:
+            _, prev_close, curr_close, _ = state
+            return (curr_close - prev_close) / prev_close if prev_close else 0.0
+        
+        # WebSocket не поднялся или молчит — через REST с кэшем на BTC_CHANGE_TTL_SEC
+        now = time.monotonic()
+        if now < self._btc_change_expiry:
+            return self._btc_change
         try:
             ohlcv = await self.get_ohlcv("BTC/USDT", "60", limit=2)
             if len(ohlcv) >= 2:
                 prev_close = ohlcv[-2][4]
                 curr_close = ohlcv[-1][4]
                 change = (curr_close - prev_close) / prev_close
+                self._btc_change = change
+                self._btc_change_expiry = now + BTC_CHANGE_TTL_SEC
                 return change
             return 0.0
         except Exception as e:
@@ -1,94 +1,577 @@
 """
 Расчёт индикаторов для анализа
 """
+import math
+from collections import OrderedDict
+from itertools import chain
+
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, NamedTuple, Tuple, Optional, Union
 from loguru import logger
+from numba import njit, prange
 
 from src.config import INDICATORS, SIGNAL_CONDITIONS
 
+# Параметры конфига — константы модуля (конфиг неизменяемый, MappingProxyType),
+# чтобы не искать их в словарях на каждой паре
+_EMA_TREND = INDICATORS["ema_trend"]
+_VOLUME_SMA = INDICATORS["volume_sma"]
+_ATR_PERIOD = INDICATORS["atr_period"]
+_RSI_PERIOD = INDICATORS["rsi_period"]
+_LOOKBACK = INDICATORS["lookback_candles"]
+
+_ACC_RANGE_MULT = SIGNAL_CONDITIONS["accumulation_range_mult"]
+_ACC_VOLUME_RATIO = SIGNAL_CONDITIONS["accumulation_volume_ratio"]
+_MIN_GROWTH = SIGNAL_CONDITIONS["min_candle_growth"]
+_MAX_GROWTH = SIGNAL_CONDITIONS["max_candle_growth"]
+_VOLUME_BREAKOUT_MULT = SIGNAL_CONDITIONS["volume_breakout_mult"]
+_MIN_RSI = SIGNAL_CONDITIONS.get("min_rsi", 0)
+_MAX_RSI = SIGNAL_CONDITIONS.get("max_rsi", 100)
+_REQUIRE_EMA_SETUP = SIGNAL_CONDITIONS.get("require_ema_setup", False)
+_MAX_SPREAD = SIGNAL_CONDITIONS["max_spread"]
+_MIN_BID_ASK_RATIO = SIGNAL_CONDITIONS["min_bid_ask_ratio"]
+
+# Колонки EMA (adjust=False) и их периоды — считаются одним проходом _emas
+_EMA_COLUMNS = ['ema7', 'ema14', 'ema28', 'ema100', 'ema9', 'ema21', 'ema50']
+_EMA_ALPHAS = np.array([
+    2.0 / (span + 1) for span in (
+        INDICATORS["ema_fast"],
+        INDICATORS["ema_mid"],
+        INDICATORS["ema_slow"],
+        _EMA_TREND,
+        INDICATORS.get("ema9", 9),
+        INDICATORS.get("ema21", 21),
+        INDICATORS.get("ema50", 50),
+    )
+], dtype=np.float64)
+
+
+@njit(cache=True, fastmath=True, boundscheck=False)
+def _emas(close, alphas):
+    """
+    Все EMA за один проход: y[t] = a*x[t] + (1-a)*y[t-1], y[0] = x[0]
+    (то же, что ewm(span, adjust=False).mean()). Возвращает массив (k, n):
+    строка на EMA, каждая — сплошной массив.
+    """
+    n = close.shape[0]
+    k = alphas.shape[0]
+    out = np.empty((k, n), dtype=np.float64)
+    if n == 0:
+        return out
+    for j in range(k):
+        out[j, 0] = close[0]
+    for t in range(1, n):
+        x = close[t]
+        for j in range(k):
+            a = alphas[j]
+            out[j, t] = a * x + (1.0 - a) * out[j, t - 1]
+    return out
+
+
+@njit(cache=True, boundscheck=False)
+def _tr_atr(high, low, close, period):
+    """
+    ATR (SMA от True Range) за один проход со скользящей суммой.
+    Как в pandas: TR первой свечи не определён, ATR — с индекса period.
+    """
+    n = close.shape[0]
+    atr = np.full(n, np.nan)
+    tr_buf = np.empty(n, dtype=np.float64)
+    running_sum = 0.0
+    for i in range(1, n):
+        h = high[i]
+        l = low[i]
+        cp = close[i - 1]
+        tr = max(h - l, abs(h - cp), abs(l - cp))
+        tr_buf[i] = tr
+        running_sum += tr
+        if i > period:
+            running_sum -= tr_buf[i - period]
+        if i >= period:
+            atr[i] = running_sum / period
+    return atr
+
+
+@njit(cache=True, boundscheck=False)
+def _rsi(close, period):
+    """
+    RSI на SMA средних (как rolling(period).mean() от gain/loss) за один проход.
+    Первое изменение считается нулевым, RSI — с индекса period-1.
+    Счётчики ненулевых gain/loss дают точный ноль средней без накопленной
+    ошибки суммы: нет потерь → 100, нет ни роста, ни потерь → NaN.
+    """
+    n = close.shape[0]
+    rsi = np.full(n, np.nan)
+    # gain/loss без ветвлений (select → maxsd), цикл векторизуется
+    gains = np.zeros(n, dtype=np.float64)
+    losses = np.zeros(n, dtype=np.float64)
+    for i in range(1, n):
+        d = close[i] - close[i - 1]
+        gains[i] = d if d > 0.0 else 0.0
+        losses[i] = -d if d < 0.0 else 0.0
+    sum_gain = 0.0
+    sum_loss = 0.0
+    cnt_gain = 0
+    cnt_loss = 0
+    for i in range(n):
+        sum_gain += gains[i]
+        sum_loss += losses[i]
+        cnt_gain += gains[i] > 0.0
+        cnt_loss += losses[i] > 0.0
+        if i >= period:
+            j = i - period
+            sum_gain -= gains[j]
+            sum_loss -= losses[j]
+            cnt_gain -= gains[j] > 0.0
+            cnt_loss -= losses[j] > 0.0
+        if i >= period - 1:
+            ag = sum_gain / period if cnt_gain else 0.0
+            al = sum_loss / period if cnt_loss else 0.0
+            if al > 0:
+                rsi[i] = 100.0 - 100.0 / (1.0 + ag / al)
+            elif ag > 0:
+                rsi[i] = 100.0
+    return rsi
+
+
+@njit(cache=True, boundscheck=False)
+def _rolling_max(arr, w):
+    """
+    Скользящий максимум за O(n): монотонная очередь индексов в кольцевом буфере,
+    значения, перекрытые более новым максимумом, выбрасываются. Первые w-1 — NaN.
+    """
+    n = arr.shape[0]
+    out = np.full(n, np.nan)
+    dq = np.empty(w, dtype=np.int64)
+    head = 0
+    size = 0
+    for i in range(n):
+        if size and dq[head] <= i - w:
+            head = (head + 1) % w
+            size -= 1
+        while size and arr[dq[(head + size - 1) % w]] <= arr[i]:
+            size -= 1
+        dq[(head + size) % w] = i
+        size += 1
+        if i >= w - 1:
+            out[i] = arr[dq[head]]
+    return out
+
+
+@njit(cache=True, boundscheck=False)
+def _rolling_min(arr, w):
+    """Скользящий минимум — зеркально _rolling_max"""
+    n = arr.shape[0]
+    out = np.full(n, np.nan)
+    dq = np.empty(w, dtype=np.int64)
+    head = 0
+    size = 0
+    for i in range(n):
+        if size and dq[head] <= i - w:
+            head = (head + 1) % w
+            size -= 1
+        while size and arr[dq[(head + size - 1) % w]] >= arr[i]:
+            size -= 1
+        dq[(head + size) % w] = i
+        size += 1
+        if i >= w - 1:
+            out[i] = arr[dq[head]]
+    return out
+
+
+@njit(cache=True, boundscheck=False, error_model='numpy')
+def _ema_metrics(open_, close, ema7, ema14, ema28, ema100):
+    """
+    candle_growth, ema_spread и ema100_slope за один проход по уже готовым EMA.
+    Считаем в float64, храним во float32 — это доли, их сравнивают с порогами
+    вроде 0.02, а не с ценами. error_model='numpy': деление на ноль даёт inf/NaN.
+    """
+    n = close.shape[0]
+    candle_growth = np.empty(n, dtype=np.float32)
+    ema_spread = np.empty(n, dtype=np.float32)
+    ema100_slope = np.full(n, np.nan, dtype=np.float32)
+    for i in range(n):
+        c = close[i]
+        candle_growth[i] = (c - open_[i]) / open_[i]
+        ema_spread[i] = (abs(ema7[i] - ema14[i]) + abs(ema14[i] - ema28[i])) / c
+        if i >= 5:
+            ema100_slope[i] = (ema100[i] - ema100[i - 5]) / ema100[i - 5]
+    return candle_growth, ema_spread, ema100_slope
+
+
+@njit(cache=True, boundscheck=False)
+def _rolling_nanmean32(arr, w):
+    """
+    Скользящее среднее без NaN (как Series.mean() на окне) для долей float32.
+    Окно короткое, поэтому сумма честно пересчитывается: inf не «залипает»
+    в бегущей сумме. Окно без значений и первые w-1 позиций — NaN.
+    """
+    n = arr.shape[0]
+    out = np.full(n, np.nan, dtype=np.float32)
+    for i in range(w - 1, n):
+        total = 0.0
+        cnt = 0
+        for j in range(i - w + 1, i + 1):
+            x = arr[j]
+            if not np.isnan(x):
+                total += x
+                cnt += 1
+        if cnt:
+            out[i] = total / cnt
+    return out
+
+
+@njit(cache=True, boundscheck=False)
+def _rolling_mean(values, window):
+    """rolling(window).mean() через кумулятивную сумму; первые window-1 — NaN"""
+    out = np.full(values.shape[0], np.nan)
+    if values.shape[0] >= window:
+        csum = np.cumsum(values)
+        out[window - 1] = csum[window - 1]
+        out[window:] = csum[window:] - csum[:-window]
+        out[window - 1:] /= window
+    return out
+
+
+@njit(cache=True, parallel=True, nogil=True, boundscheck=False, error_model='numpy')
+def _indicators_batch(batch, alphas, volume_sma, atr_period, rsi_period, lookback):
+    """
+    Индикаторы для пачки пар одинаковой длины: batch (s, n, 6) → массивы (s, n),
+    EMA — (s, k, n). Пары считаются параллельно (prange) теми же ядрами,
+    что и calculate_indicators, поэтому значения совпадают побитно.
+    nogil: сканер вызывает ядро из потока, event loop в это время свободен.
+    """
+    s, n, _ = batch.shape
+    k = alphas.shape[0]
+    emas = np.empty((s, k, n), dtype=np.float64)
+    atr14 = np.empty((s, n), dtype=np.float64)
+    rsi14 = np.empty((s, n), dtype=np.float64)
+    high_20 = np.empty((s, n), dtype=np.float64)
+    low_20 = np.empty((s, n), dtype=np.float64)
+    candle_growth = np.empty((s, n), dtype=np.float32)
+    volume_ratio = np.empty((s, n), dtype=np.float32)
+    volume_ratio_sma20 = np.empty((s, n), dtype=np.float32)
+    ema_spread = np.empty((s, n), dtype=np.float32)
+    ema100_slope = np.empty((s, n), dtype=np.float32)
+    for i in prange(s):
+        open_ = np.ascontiguousarray(batch[i, :, 1])
+        high = np.ascontiguousarray(batch[i, :, 2])
+        low = np.ascontiguousarray(batch[i, :, 3])
+        close = np.ascontiguousarray(batch[i, :, 4])
+        volume = np.ascontiguousarray(batch[i, :, 5])
+        e = _emas(close, alphas)
+        emas[i] = e
+        sma = _rolling_mean(volume, volume_sma)
+        atr14[i] = _tr_atr(high, low, close, atr_period)
+        rsi14[i] = _rsi(close, rsi_period)
+        high_20[i] = _rolling_max(high, lookback)
+        low_20[i] = _rolling_min(low, lookback)
+        growth, spread, slope = _ema_metrics(open_, close, e[0], e[1], e[2], e[3])
+        candle_growth[i] = growth
+        ema_spread[i] = spread
+        ema100_slope[i] = slope
+        ratio = np.empty(n, dtype=np.float32)
+        for t in range(n):
+            ratio[t] = volume[t] / sma[t]
+        volume_ratio[i] = ratio
+        volume_ratio_sma20[i] = _rolling_nanmean32(ratio, lookback)
+    return (
+        emas, atr14, rsi14, high_20, low_20,
+        candle_growth, volume_ratio, volume_ratio_sma20, ema_spread, ema100_slope,
+    )
+
+
+@njit(cache=True, boundscheck=False)
+def _round_to(x, scale):
+    return np.round(x * scale) / scale
+
+
+@njit(cache=True, boundscheck=False)
+def _levels(entry_price, atr, ema28, low_20):
+    """Уровни сделки одним массивом в порядке _LEVEL_KEYS"""
+    out = np.empty(8, dtype=np.float64)
+    # Entry zone
+    out[0] = _round_to(entry_price * 0.998, 1e6)
+    out[1] = _round_to(entry_price * 1.002, 1e6)
+
+    # Stop Loss - под EMA28 или под low_20 с буфером (что ниже)
+    sl_ema28 = ema28 * 0.995
+    sl_low = low_20 * 0.995
+    stop_loss = sl_low if sl_low < sl_ema28 else sl_ema28
+    out[2] = _round_to(stop_loss, 1e6)
+
+    # Take Profits: +5% / +10% / +15%
+    out[3] = _round_to(entry_price * 1.05, 1e6)
+    out[4] = _round_to(entry_price * 1.10, 1e6)
+    out[5] = _round_to(entry_price * 1.15, 1e6)
+
+    # Риск/прибыль
+    risk = entry_price - stop_loss
+    reward1 = entry_price * 1.05 - entry_price
+    rr_ratio = reward1 / risk if risk > 0 else 0.0
+    out[6] = _round_to(risk / entry_price * 100, 1e2)
+    out[7] = _round_to(rr_ratio, 1e2)
+    return out
+
+
+_LEVEL_KEYS = (
+    "entry_low", "entry_high", "stop_loss",
+    "tp1", "tp2", "tp3", "risk_pct", "rr_ratio",
+)
 
-def calculate_indicators(ohlcv: List[List]) -> Optional[pd.DataFrame]:
+
+# Компиляция при импорте, а не на первой паре скана
+_warm = np.zeros(1, dtype=np.float64)
+_emas(_warm, _EMA_ALPHAS)
+_tr_atr(_warm, _warm, _warm, 14)
+_rsi(_warm, 14)
+_rolling_max(_warm, 20)
+_rolling_min(_warm, 20)
+_ema_metrics(_warm, _warm, _warm, _warm, _warm, _warm)
+_rolling_nanmean32(_warm.astype(np.float32), 20)
+_rolling_mean(_warm, 20)
+_indicators_batch(np.zeros((1, 1, 6)), _EMA_ALPHAS, 20, 14, 14, 20)
+_levels(1.0, 1.0, 1.0, 1.0)
+del _warm
+
+
+class IndicatorArrays(NamedTuple):
+    """Колонки DataFrame индикаторов как numpy-массивы (детекторы читают arr[-1])"""
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    ema7: np.ndarray
+    ema14: np.ndarray
+    ema28: np.ndarray
+    ema100: np.ndarray
+    ema9: np.ndarray
+    ema21: np.ndarray
+    ema50: np.ndarray
+    atr14: np.ndarray
+    rsi14: np.ndarray
+    high_20: np.ndarray
+    low_20: np.ndarray
+    candle_growth: np.ndarray
+    volume_ratio: np.ndarray
+    volume_ratio_sma20: np.ndarray
+    ema_spread: np.ndarray
+    ema100_slope: np.ndarray
+
+
+def ohlcv_matrix(ohlcv) -> np.ndarray:
+    """
+    Свечи (N, 6) в float64-матрицу. Список списков от ccxt разворачивается
+    одним np.fromiter с известным count — без двухпроходного вывода формы
+    и типа, как у np.asarray; готовый ndarray возвращается без копии.
+    """
+    if isinstance(ohlcv, np.ndarray):
+        return np.asarray(ohlcv, dtype=np.float64)
+    return np.fromiter(
+        chain.from_iterable(ohlcv), dtype=np.float64, count=len(ohlcv) * 6
+    ).reshape(len(ohlcv), 6)
+
+
+def _nanmean(values: np.ndarray) -> float:
+    """Среднее без NaN, как Series.mean(); для пустого окна — NaN без warning"""
+    valid = values[~np.isnan(values)]
+    return float(valid.mean(dtype=np.float64)) if valid.size else np.nan
+
+
+def indicator_arrays(df: pd.DataFrame) -> IndicatorArrays:
+    """
+    Массивы, сохранённые calculate_indicators в df.attrs['arrays'].
+    Срез DataFrame наследует attrs, поэтому при другой длине собираем заново.
+    """
+    arrays = df.attrs.get('arrays')
+    if arrays is not None and arrays.close.shape[0] == len(df):
+        return arrays
+    return IndicatorArrays(*(
+        df[name].to_numpy() for name in IndicatorArrays._fields
+    ))
+
+
+# Кэш результатов calculate_indicators: повторный скан той же свечи не пересчитывает
+IND_CACHE_MAX = 512
+_ind_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+# Последний результат по cache_key — база для пересчёта одной свечи (LRU, тот же лимит)
+_ind_last: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+
+
+def _indicator_columns(mat: np.ndarray) -> Dict[str, np.ndarray]:
+    """Полный расчёт: колонки результата по матрице свечей (n, 6) float64"""
+    # Столбцы матрицы — сплошными строками: ядра numba получают C-массивы
+    ts, open_np, high_np, low_np, close_np, volume_np = np.ascontiguousarray(mat.T)
+    
+    # ================== EMA ==================
+    # ema7/14/28/100 + ema9/21/50 для профессиональной стратегии
+    emas = _emas(close_np, _EMA_ALPHAS)
+    
+    # ================== Volume SMA ==================
+    # Промежуточная: нужна только для volume_ratio, в DataFrame не пишем
+    volume_sma20 = _rolling_mean(volume_np, _VOLUME_SMA)
+    
+    # ================== ATR ==================
+    atr14 = _tr_atr(high_np, low_np, close_np, _ATR_PERIOD)
+    
+    # ================== RSI ==================
+    rsi14 = _rsi(close_np, _RSI_PERIOD)
+    
+    # ================== High/Low за N свечей ==================
+    high_20 = _rolling_max(high_np, _LOOKBACK)
+    low_20 = _rolling_min(low_np, _LOOKBACK)
+    
+    # ================== Дополнительные метрики ==================
+    # Рост свечи, EMA сплетение и наклон EMA100 — одним ядром
+    candle_growth, ema_spread, ema100_slope = _ema_metrics(
+        open_np, close_np, emas[0], emas[1], emas[2], emas[3],
+    )
+    
+    # Объём относительно SMA (доля — float32, как и метрики выше)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume_ratio = (volume_np / volume_sma20).astype(np.float32)
+    # Средний объём относительно SMA за lookback свечей — для детектора накопления
+    volume_ratio_sma20 = _rolling_nanmean32(volume_ratio, _LOOKBACK)
+    
+    columns = {
+        'timestamp': ts.astype(np.int64),
+        'open': open_np,
+        'high': high_np,
+        'low': low_np,
+        'close': close_np,
+        'volume': volume_np,
+    }
+    for k, name in enumerate(_EMA_COLUMNS):
+        columns[name] = emas[k]
+    columns.update({
+        'atr14': atr14,
+        'rsi14': rsi14,
+        'high_20': high_20,
+        'low_20': low_20,
+        'candle_growth': candle_growth,
+        'volume_ratio': volume_ratio,
+        'volume_ratio_sma20': volume_ratio_sma20,
+        'ema_spread': ema_spread,
+        'ema100_slope': ema100_slope,
+    })
+    return columns
+
+
+def _same_history(prev: pd.DataFrame, ohlcv: List[List]) -> bool:
+    """Та же формирующаяся свеча: совпадают длина, крайние метки и предпоследняя свеча"""
+    a = indicator_arrays(prev)
+    n = len(ohlcv)
+    if a.close.shape[0] != n:
+        return False
+    ts = prev['timestamp'].to_numpy()
+    if ts[0] != ohlcv[0][0] or ts[-1] != ohlcv[-1][0]:
+        return False
+    _, o, h, l, c, v = ohlcv[-2]
+    return (
+        a.open[-2] == o and a.high[-2] == h and a.low[-2] == l
+        and a.close[-2] == c and a.volume[-2] == v
+    )
+
+
+def _update_last_candle(prev: pd.DataFrame, row: List) -> Dict[str, np.ndarray]:
+    """
+    Обновилась только последняя свеча: история та же, поэтому пересчитываем
+    одну строку — шаг EMA от предыдущего значения и окна ATR/RSI/SMA/экстремумов.
+    """
+    columns = {name: prev[name].to_numpy(copy=True) for name in prev.columns}
+    _, o, h, l, c, v = row
+    columns['open'][-1] = o
+    columns['high'][-1] = h
+    columns['low'][-1] = l
+    columns['close'][-1] = c
+    columns['volume'][-1] = v
+    high_np, low_np, close_np = columns['high'], columns['low'], columns['close']
+    volume_np = columns['volume']
+    close = close_np[-1]
+    
+    for k, name in enumerate(_EMA_COLUMNS):
+        alpha = _EMA_ALPHAS[k]
+        ema = columns[name]
+        ema[-1] = alpha * close + (1.0 - alpha) * ema[-2]
+    
+    volume_sma20 = volume_np[-_VOLUME_SMA:].mean()
+    
+    p = _ATR_PERIOD + 1
+    columns['atr14'][-1] = _tr_atr(high_np[-p:], low_np[-p:], close_np[-p:], p - 1)[-1]
+    
+    p = _RSI_PERIOD + 1
+    columns['rsi14'][-1] = _rsi(close_np[-p:], p - 1)[-1]
+    
+    columns['high_20'][-1] = high_np[-_LOOKBACK:].max()
+    columns['low_20'][-1] = low_np[-_LOOKBACK:].min()
+    
+    ema7, ema14, ema28 = columns['ema7'][-1], columns['ema14'][-1], columns['ema28'][-1]
+    ema100 = columns['ema100']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        columns['candle_growth'][-1] = (close - columns['open'][-1]) / columns['open'][-1]
+        columns['volume_ratio'][-1] = volume_np[-1] / volume_sma20
+        columns['ema_spread'][-1] = (abs(ema7 - ema14) + abs(ema14 - ema28)) / close
+        columns['ema100_slope'][-1] = (ema100[-1] - ema100[-6]) / ema100[-6]
+    columns['volume_ratio_sma20'][-1] = _nanmean(columns['volume_ratio'][-_LOOKBACK:])
+    return columns
+
+
+def calculate_indicators(
+    ohlcv: Union[List[List], np.ndarray], cache_key: Optional[str] = None
+) -> Optional[pd.DataFrame]:
     """
     Рассчитывает все индикаторы для DataFrame свечей.
     
     Входные данные: [[timestamp, open, high, low, close, volume], ...]
+    или уже готовая матрица (N, 6).
+    cache_key — обычно символ пары. Результат кэшируется по (cache_key, длина,
+    время первой свечи, вся последняя свеча): пока формирующаяся свеча не
+    изменилась, возвращается тот же DataFrame (его нельзя менять на месте).
+    Если изменилась только последняя свеча, пересчитывается одна строка.
     
     Возвращает DataFrame с колонками:
     - timestamp, open, high, low, close, volume
     - ema7, ema14, ema28, ema100
-    - volume_sma20
     - atr14
     - rsi14
     - high_20, low_20 (макс/мин за 20 свечей)
+    - candle_growth, volume_ratio, volume_ratio_sma20, ema_spread, ema100_slope
     """
-    if not ohlcv or len(ohlcv) < INDICATORS["ema_trend"]:
+    if ohlcv is None or len(ohlcv) < _EMA_TREND:
         return None
     
+    key = (cache_key, len(ohlcv), ohlcv[0][0], tuple(ohlcv[-1]))
+    cached = _ind_cache.get(key)
+    if cached is not None:
+        _ind_cache.move_to_end(key)
+        return cached
+    
     try:
-        df = pd.DataFrame(
-            ohlcv,
-            columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
-        )
-        
-        # Приводим типы
-        for col in ['open', 'high', 'low', 'close', 'volume']:
-            df[col] = df[col].astype(float)
-        
-        # ================== EMA ==================
-        df['ema7'] = df['close'].ewm(span=INDICATORS["ema_fast"], adjust=False).mean()
-        df['ema14'] = df['close'].ewm(span=INDICATORS["ema_mid"], adjust=False).mean()
-        df['ema28'] = df['close'].ewm(span=INDICATORS["ema_slow"], adjust=False).mean()
-        df['ema100'] = df['close'].ewm(span=INDICATORS["ema_trend"], adjust=False).mean()
-        
-        # EMA для профессиональной стратегии
-        df['ema9'] = df['close'].ewm(span=INDICATORS.get("ema9", 9), adjust=False).mean()
-        df['ema21'] = df['close'].ewm(span=INDICATORS.get("ema21", 21), adjust=False).mean()
-        df['ema50'] = df['close'].ewm(span=INDICATORS.get("ema50", 50), adjust=False).mean()
-        
-        # ================== Volume SMA ==================
-        df['volume_sma20'] = df['volume'].rolling(window=INDICATORS["volume_sma"]).mean()
-        
-        # ================== ATR ==================
-        df['tr'] = np.maximum(
-            df['high'] - df['low'],
-            np.maximum(
-                abs(df['high'] - df['close'].shift(1)),
-                abs(df['low'] - df['close'].shift(1))
-            )
-        )
-        df['atr14'] = df['tr'].rolling(window=INDICATORS["atr_period"]).mean()
-        
-        # ================== RSI ==================
-        delta = df['close'].diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.rolling(window=INDICATORS["rsi_period"]).mean()
-        avg_loss = loss.rolling(window=INDICATORS["rsi_period"]).mean()
-        rs = avg_gain / avg_loss
-        df['rsi14'] = 100 - (100 / (1 + rs))
-        
-        # ================== High/Low за N свечей ==================
-        lookback = INDICATORS["lookback_candles"]
-        df['high_20'] = df['high'].rolling(window=lookback).max()
-        df['low_20'] = df['low'].rolling(window=lookback).min()
-        
-        # ================== Дополнительные метрики ==================
-        # Рост текущей свечи
-        df['candle_growth'] = (df['close'] - df['open']) / df['open']
-        
-        # Объём относительно SMA
-        df['volume_ratio'] = df['volume'] / df['volume_sma20']
-        
-        # EMA сплетение (разница между ними)
-        df['ema_spread'] = (
-            abs(df['ema7'] - df['ema14']) + 
-            abs(df['ema14'] - df['ema28'])
-        ) / df['close']
-        
-        # Наклон EMA100 (плоская или нет)
-        df['ema100_slope'] = (df['ema100'] - df['ema100'].shift(5)) / df['ema100'].shift(5)
+        prev = _ind_last.get(cache_key) if cache_key is not None else None
+        if prev is not None and _same_history(prev, ohlcv):
+            columns = _update_last_candle(prev, ohlcv[-1])
+        else:
+            # Сразу в float64-матрицу, без DataFrame из списка списков
+            columns = _indicator_columns(ohlcv_matrix(ohlcv))
+        
+        # DataFrame собираем один раз в конце
+        df = pd.DataFrame(columns)
+        
+        # Массивы колонок — один раз здесь, а не iloc[-1] в каждом детекторе
+        df.attrs['arrays'] = IndicatorArrays(*(
+            df[name].to_numpy() for name in IndicatorArrays._fields
+        ))
+        
+        _ind_cache[key] = df
+        if len(_ind_cache) > IND_CACHE_MAX:
+            _ind_cache.popitem(last=False)
+        if cache_key is not None:
+            _ind_last[cache_key] = df
+            _ind_last.move_to_end(cache_key)
+            if len(_ind_last) > IND_CACHE_MAX:
+                _ind_last.popitem(last=False)
         
         return df
         
@@ -97,6 +580,63 @@ def calculate_indicators(ohlcv: List[List]) -> Optional[pd.DataFrame]:
         return None
 
 
+def calculate_indicators_batch(ohlcv_batch: np.ndarray) -> IndicatorArrays:
+    """
+    Индикаторы сразу для пачки пар: ohlcv_batch (пары, свечи, 6) одной длины.
+    Возвращает IndicatorArrays с массивами (пары, свечи) — для батч-детекторов.
+    """
+    batch = np.ascontiguousarray(ohlcv_batch, dtype=np.float64)
+    (
+        emas, atr14, rsi14, high_20, low_20,
+        candle_growth, volume_ratio, volume_ratio_sma20, ema_spread, ema100_slope,
+    ) = _indicators_batch(
+        batch, _EMA_ALPHAS, _VOLUME_SMA, _ATR_PERIOD, _RSI_PERIOD, _LOOKBACK
+    )
+    ema = dict(zip(_EMA_COLUMNS, (emas[:, k] for k in range(len(_EMA_COLUMNS)))))
+    return IndicatorArrays(
+        open=batch[:, :, 1],
+        high=batch[:, :, 2],
+        low=batch[:, :, 3],
+        close=batch[:, :, 4],
+        volume=batch[:, :, 5],
+        atr14=atr14,
+        rsi14=rsi14,
+        high_20=high_20,
+        low_20=low_20,
+        candle_growth=candle_growth,
+        volume_ratio=volume_ratio,
+        volume_ratio_sma20=volume_ratio_sma20,
+        ema_spread=ema_spread,
+        ema100_slope=ema100_slope,
+        **ema,
+    )
+
+
+def detect_accumulation_batch(a: IndicatorArrays) -> np.ndarray:
+    """Маска пар с накоплением — те же условия, что в detect_accumulation"""
+    atr = a.atr14[:, -1]
+    price_range = a.high_20[:, -1] - a.low_20[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        range_ratio = np.where(atr > 0, price_range / atr, 999.0)
+    range_ok = range_ratio <= _ACC_RANGE_MULT
+    volume_low = a.volume_ratio_sma20[:, -1].astype(np.float64) < _ACC_VOLUME_RATIO
+    return range_ok & volume_low
+
+
+def detect_breakout_batch(a: IndicatorArrays) -> np.ndarray:
+    """Маска пар с пробоем — те же условия, что в detect_breakout"""
+    # Доли float32 сравниваем в float64, как float(...) в скалярных детекторах
+    growth = a.candle_growth[:, -1].astype(np.float64)
+    growth_ok = (_MIN_GROWTH <= growth) & (growth <= _MAX_GROWTH)
+    volume_spike = a.volume_ratio[:, -1].astype(np.float64) >= _VOLUME_BREAKOUT_MULT
+    rsi = a.rsi14[:, -1]
+    rsi_ok = (_MIN_RSI <= rsi) & (rsi <= _MAX_RSI)
+    mask = growth_ok & volume_spike & rsi_ok
+    if _REQUIRE_EMA_SETUP:
+        mask &= (a.ema9[:, -1] > a.ema21[:, -1]) & (a.close[:, -1] > a.ema50[:, -1])
+    return mask
+
+
 def detect_accumulation(df: pd.DataFrame) -> Tuple[bool, Dict]:
     """
     Определяет фазу накопления за последние 20 свечей.
@@ -109,31 +649,30 @@ def detect_accumulation(df: pd.DataFrame) -> Tuple[bool, Dict]:
     - bool: есть накопление или нет
     - dict: метрики накопления
     """
-    if df is None or len(df) < INDICATORS["lookback_candles"]:
+    if df is None or len(df) < _LOOKBACK:
         return False, {}
     
     try:
-        lookback = INDICATORS["lookback_candles"]
-        recent = df.tail(lookback)
-        last = df.iloc[-1]
+        a = indicator_arrays(df)
         
-        # 1. Диапазон цены (основной критерий)
-        price_range = recent['high'].max() - recent['low'].min()
-        atr = last['atr14']
+        # 1. Диапазон цены (основной критерий): high_20/low_20 — то же окно
+        price_range = a.high_20[-1] - a.low_20[-1]
+        atr = a.atr14[-1]
         range_ratio = price_range / atr if atr > 0 else 999
-        range_ok = range_ratio <= SIGNAL_CONDITIONS["accumulation_range_mult"]
+        range_ok = range_ratio <= _ACC_RANGE_MULT
         
         # 2. EMA сплетение (опционально - не блокирует)
-        ema_spread = last['ema_spread']
+        ema_spread = float(a.ema_spread[-1])
         ema_tangled = ema_spread < 0.02  # смягчено до 2%
         
         # 3. EMA100 наклон (опционально - не блокирует)
-        ema100_slope = abs(last['ema100_slope']) if pd.notna(last['ema100_slope']) else 0
+        ema100_slope = float(a.ema100_slope[-1])
+        ema100_slope = abs(ema100_slope) if not math.isnan(ema100_slope) else 0
         ema100_flat = ema100_slope < 0.02  # смягчено до 2%
         
         # 4. Объём за период (основной критерий)
-        avg_volume_ratio = recent['volume_ratio'].mean()
-        volume_low = avg_volume_ratio < SIGNAL_CONDITIONS["accumulation_volume_ratio"]
+        avg_volume_ratio = float(a.volume_ratio_sma20[-1])
+        volume_low = avg_volume_ratio < _ACC_VOLUME_RATIO
         
         # УПРОЩЁННЫЙ ИТОГ: только range и volume важны
         is_accumulation = range_ok and volume_low
@@ -169,56 +708,51 @@ def detect_breakout(df: pd.DataFrame) -> Tuple[bool, Dict]:
     - bool: есть пробой или нет
     - dict: метрики пробоя
     """
-    if df is None or len(df) < INDICATORS["lookback_candles"] + 2:
+    if df is None or len(df) < _LOOKBACK + 2:
         return False, {}
     
     try:
-        last = df.iloc[-1]
-        prev = df.iloc[-2]
-        prev2 = df.iloc[-3]
+        a = indicator_arrays(df)
         
-        # Предыдущий high_20 (без текущей свечи)
-        lookback = INDICATORS["lookback_candles"]
-        prev_high_20 = df['high'].iloc[-lookback-1:-1].max()
+        # Предыдущий high_20 (без текущей свечи) — уже посчитан на прошлой строке
+        prev_high_20 = a.high_20[-2]
         
         # 1. Рост свечи в диапазоне
-        candle_growth = last['candle_growth']
+        candle_growth = float(a.candle_growth[-1])
         growth_ok = (
-            SIGNAL_CONDITIONS["min_candle_growth"] <= candle_growth <= 
-            SIGNAL_CONDITIONS["max_candle_growth"]
+            _MIN_GROWTH <= candle_growth <= 
+            _MAX_GROWTH
         )
         
         # 2. Объём ≥ 3.0x (ПРОФЕССИОНАЛЬНАЯ СТРАТЕГИЯ - аномалия!)
-        volume_spike = last['volume_ratio'] >= SIGNAL_CONDITIONS["volume_breakout_mult"]
+        volume_spike = float(a.volume_ratio[-1]) >= _VOLUME_BREAKOUT_MULT
         
         # 3. RSI в импульсной фазе (50-70)
-        min_rsi = SIGNAL_CONDITIONS.get("min_rsi", 0)
-        max_rsi = SIGNAL_CONDITIONS.get("max_rsi", 100)
-        rsi_ok = min_rsi <= last['rsi14'] <= max_rsi
+        rsi_ok = _MIN_RSI <= a.rsi14[-1] <= _MAX_RSI
         
         # 4. EMA структура (ПРОФЕССИОНАЛЬНАЯ СТРАТЕГИЯ)
         ema_setup_ok = True
         ema9_above_ema21 = False
         price_above_ema50 = False
         
-        if SIGNAL_CONDITIONS.get("require_ema_setup", False):
+        if _REQUIRE_EMA_SETUP:
             # EMA9 > EMA21 (восходящий тренд)
-            ema9_above_ema21 = last['ema9'] > last['ema21']
+            ema9_above_ema21 = a.ema9[-1] > a.ema21[-1]
             # Price > EMA50 (выше среднесрочного тренда)
-            price_above_ema50 = last['close'] > last['ema50']
+            price_above_ema50 = a.close[-1] > a.ema50[-1]
             ema_setup_ok = ema9_above_ema21 and price_above_ema50
         
         # Опциональные (для метрик):
         # Пробой High20
-        breakout_high = last['close'] > prev_high_20
+        breakout_high = a.close[-1] > prev_high_20
         
         # Закрытие выше EMA100
-        above_ema100 = last['close'] > last['ema100']
+        above_ema100 = a.close[-1] > a.ema100[-1]
         
         # EMA7 пересекает EMA14 снизу вверх
         ema_cross = (
-            (prev['ema7'] <= prev['ema14'] or prev2['ema7'] <= prev2['ema14']) and
-            last['ema7'] > last['ema14']
+            (a.ema7[-2] <= a.ema14[-2] or a.ema7[-3] <= a.ema14[-3]) and
+            a.ema7[-1] > a.ema14[-1]
         )
         
         # ПРОФЕССИОНАЛЬНАЯ СТРАТЕГИЯ: growth + volume anomaly + RSI + EMA setup
@@ -226,14 +760,14 @@ def detect_breakout(df: pd.DataFrame) -> Tuple[bool, Dict]:
         
         metrics = {
             "prev_high_20": prev_high_20,
-            "current_close": last['close'],
-            "ema9": last['ema9'],
-            "ema21": last['ema21'],
-            "ema50": last['ema50'],
-            "ema100": last['ema100'],
-            "volume_ratio": round(last['volume_ratio'], 2),
+            "current_close": a.close[-1],
+            "ema9": a.ema9[-1],
+            "ema21": a.ema21[-1],
+            "ema50": a.ema50[-1],
+            "ema100": a.ema100[-1],
+            "volume_ratio": round(float(a.volume_ratio[-1]), 2),
             "candle_growth": round(candle_growth * 100, 2),
-            "rsi": round(last['rsi14'], 1),
+            "rsi": round(a.rsi14[-1], 1),
             "breakout_high": breakout_high,
             "above_ema100": above_ema100,
             "ema_cross": ema_cross,
@@ -274,24 +808,24 @@ def check_false_pump_filter(
         return False, {}
     
     try:
-        last = df.iloc[-1]
+        a = indicator_arrays(df)
         
         # 1. Рост свечи
-        candle_growth = last['candle_growth']
+        candle_growth = float(a.candle_growth[-1])
         growth_ok = (
-            SIGNAL_CONDITIONS["min_candle_growth"] <= candle_growth <= 
-            SIGNAL_CONDITIONS["max_candle_growth"]
+            _MIN_GROWTH <= candle_growth <= 
+            _MAX_GROWTH
         )
         
         # 2. RSI
-        rsi = last['rsi14']
-        rsi_ok = rsi <= SIGNAL_CONDITIONS["max_rsi"]
+        rsi = a.rsi14[-1]
+        rsi_ok = rsi <= _MAX_RSI
         
         # 3. Спред
-        spread_ok = spread <= SIGNAL_CONDITIONS["max_spread"]
+        spread_ok = spread <= _MAX_SPREAD
         
         # 4. Стакан
-        orderbook_ok = bid_ask_ratio >= SIGNAL_CONDITIONS["min_bid_ask_ratio"]
+        orderbook_ok = bid_ask_ratio >= _MIN_BID_ASK_RATIO
         
         # Итог
         passed = growth_ok and rsi_ok and spread_ok and orderbook_ok
@@ -329,35 +863,8 @@ def calculate_levels(
     TP2: +10%
     TP3: +15% (или trailing)
     """
-    # Entry zone
-    entry_low = entry_price * 0.998
-    entry_high = entry_price * 1.002
-    
-    # Stop Loss - под EMA28 с буфером
-    sl_ema28 = ema28 * 0.995
-    sl_low = low_20 * 0.995
-    stop_loss = min(sl_ema28, sl_low)
-    
-    # Take Profits
-    tp1 = entry_price * 1.05   # +5%
-    tp2 = entry_price * 1.10   # +10%
-    tp3 = entry_price * 1.15   # +15%
-    
-    # Риск/прибыль
-    risk = entry_price - stop_loss
-    reward1 = tp1 - entry_price
-    rr_ratio = reward1 / risk if risk > 0 else 0
-    
-    return {
-        "entry_low": round(entry_low, 6),
-        "entry_high": round(entry_high, 6),
-        "stop_loss": round(stop_loss, 6),
-        "tp1": round(tp1, 6),
-        "tp2": round(tp2, 6),
-        "tp3": round(tp3, 6),
-        "risk_pct": round((risk / entry_price) * 100, 2),
-        "rr_ratio": round(rr_ratio, 2),
-    }
+    lv = _levels(float(entry_price), float(atr), float(ema28), float(low_20))
+    return dict(zip(_LEVEL_KEYS, lv.tolist()))
 
 
 def detect_presignals(df: pd.DataFrame) -> Dict:
@@ -375,7 +882,7 @@ def detect_presignals(df: pd.DataFrame) -> Dict:
         "details": {...}
     }
     """
-    if df is None or len(df) < INDICATORS["lookback_candles"] + 2:
+    if df is None or len(df) < _LOOKBACK + 2:
         return {
             "conditions_met": 0,
             "volume_ok": False,
@@ -386,53 +893,49 @@ def detect_presignals(df: pd.DataFrame) -> Dict:
         }
     
     try:
-        last = df.iloc[-1]
-        prev = df.iloc[-2]
-        prev2 = df.iloc[-3]
+        a = indicator_arrays(df)
         
         # Проверяем каждое условие
         
         # 1. Volume spike ≥ 3.0x
-        volume_ok = last['volume_ratio'] >= SIGNAL_CONDITIONS["volume_breakout_mult"]
+        volume_ok = float(a.volume_ratio[-1]) >= _VOLUME_BREAKOUT_MULT
         
         # 2. Рост свечи в диапазоне
-        candle_growth = last['candle_growth']
+        candle_growth = float(a.candle_growth[-1])
         growth_ok = (
-            SIGNAL_CONDITIONS["min_candle_growth"] <= candle_growth <= 
-            SIGNAL_CONDITIONS["max_candle_growth"]
+            _MIN_GROWTH <= candle_growth <= 
+            _MAX_GROWTH
         )
         
         # 3. RSI в импульсной зоне
-        min_rsi = SIGNAL_CONDITIONS.get("min_rsi", 0)
-        max_rsi = SIGNAL_CONDITIONS.get("max_rsi", 100)
-        rsi_ok = min_rsi <= last['rsi14'] <= max_rsi
+        rsi_ok = _MIN_RSI <= a.rsi14[-1] <= _MAX_RSI
         
         # 4. EMA структура
         ema_setup_ok = True
         ema9_above_ema21 = False
         price_above_ema50 = False
         
-        if SIGNAL_CONDITIONS.get("require_ema_setup", False):
-            ema9_above_ema21 = last['ema9'] > last['ema21']
-            price_above_ema50 = last['close'] > last['ema50']
+        if _REQUIRE_EMA_SETUP:
+            ema9_above_ema21 = a.ema9[-1] > a.ema21[-1]
+            price_above_ema50 = a.close[-1] > a.ema50[-1]
             ema_setup_ok = ema9_above_ema21 and price_above_ema50
         
         # Подсчитываем выполненные условия
         conditions_met = sum([volume_ok, growth_ok, rsi_ok, ema_setup_ok])
         
         details = {
-            "volume_ratio": round(last['volume_ratio'], 2),
-            "volume_min_required": SIGNAL_CONDITIONS["volume_breakout_mult"],
+            "volume_ratio": round(float(a.volume_ratio[-1]), 2),
+            "volume_min_required": _VOLUME_BREAKOUT_MULT,
             "candle_growth": round(candle_growth * 100, 2),
-            "growth_min": SIGNAL_CONDITIONS["min_candle_growth"] * 100,
-            "growth_max": SIGNAL_CONDITIONS["max_candle_growth"] * 100,
-            "rsi": round(last['rsi14'], 1),
-            "rsi_min": min_rsi,
-            "rsi_max": max_rsi,
-            "ema9": round(last['ema9'], 6),
-            "ema21": round(last['ema21'], 6),
-            "price": round(last['close'], 6),
-            "ema50": round(last['ema50'], 6),
+            "growth_min": _MIN_GROWTH * 100,
+            "growth_max": _MAX_GROWTH * 100,
+            "rsi": round(a.rsi14[-1], 1),
+            "rsi_min": _MIN_RSI,
+            "rsi_max": _MAX_RSI,
+            "ema9": round(a.ema9[-1], 6),
+            "ema21": round(a.ema21[-1], 6),
+            "price": round(a.close[-1], 6),
+            "ema50": round(a.ema50[-1], 6),
             "ema9_above_ema21": ema9_above_ema21,
             "price_above_ema50": price_above_ema50,
         }
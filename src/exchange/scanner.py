@@ -2,22 +2,36 @@
 Сканер рынка - поиск сигналов на покупку
 """
 import asyncio
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
+
+import numpy as np
 from datetime import datetime, timezone, timedelta
 from loguru import logger
+from sqlalchemy import func, select
 
 from src.config import (
     TIMEFRAMES, SIGNAL_CONDITIONS, ANTI_FOMO, 
     SCAN_INTERVALS, RISK_MANAGEMENT
 )
-from src.database import get_db, Signal, SignalCooldown, DailyStats, Position, PositionStatus
+from src.database import (
+    get_db, Signal, SignalCooldown, Position, OPEN_POSITION_STATUSES,
+    daily_stats, set_cooldown, without_cooldown,
+)
 from src.exchange.exchange import BybitExchange
 from src.exchange.indicators import (
     calculate_indicators, detect_accumulation, 
-    detect_breakout, check_false_pump_filter, calculate_levels
+    detect_breakout, check_false_pump_filter, calculate_levels,
+    calculate_indicators_batch, detect_accumulation_batch, detect_breakout_batch,
+    ohlcv_matrix,
 )
 
 
+SCAN_OHLCV_LIMIT = 150  # Свечей основного ТФ на анализ пары
+SCAN_BATCH_SIZE = 10    # Пар в одной пачке запросов свечей
+SCAN_MAX_CONCURRENCY = 10  # Пар, анализируемых одновременно
+DAY_MS = 86_400_000
+
+
 class MarketScanner:
     """Сканер рынка для поиска breakout сигналов"""
     
@@ -25,6 +39,13 @@ class MarketScanner:
         self.exchange = exchange
         self.symbols: List[str] = []
         self.last_universe_update: Optional[datetime] = None
+        # Тикеры всех пар, загруженные одним запросом в начале scan_all
+        self._ticker_cache: Dict[str, Dict] = {}
+        # Причина отсева → число пар за последний скан
+        self.reject_stats: Dict[str, int] = {}
+        # Батч-ядро numba из потоков запускаем по одному: оно само параллельно
+        # по ядрам, а workqueue numba не допускает одновременных запусков
+        self._prefilter_lock = asyncio.Lock()
         
     async def update_universe(self):
         """Обновляет список торгуемых пар"""
@@ -73,27 +94,21 @@ class MarketScanner:
             )
         
         # 3. Проверка дневных стопов
-        with get_db() as db:
-            today = now_utc.replace(hour=0, minute=0, second=0, microsecond=0)
-            stats = db.query(DailyStats).filter(
-                DailyStats.date == today
-            ).first()
-            
-            if stats and stats.stop_losses_today >= RISK_MANAGEMENT["max_daily_losses"]:
-                conditions["can_trade"] = False
-                conditions["reasons"].append(
-                    f"Достигнут лимит стопов ({stats.stop_losses_today})"
-                )
+        stop_losses_today = daily_stats.get("stop_losses_today")
+        if stop_losses_today >= RISK_MANAGEMENT["max_daily_losses"]:
+            conditions["can_trade"] = False
+            conditions["reasons"].append(
+                f"Достигнут лимит стопов ({stop_losses_today})"
+            )
         
         # 4. Проверка количества открытых позиций
+        # (дневная статистика — из памяти, так что сессия БД здесь одна)
         with get_db() as db:
-            open_positions = db.query(Position).filter(
-                Position.status.in_([
-                    PositionStatus.OPEN,
-                    PositionStatus.PARTIAL_TP1,
-                    PositionStatus.PARTIAL_TP2
-                ])
-            ).count()
+            open_positions = db.execute(
+                select(func.count()).select_from(Position).where(
+                    Position.status.in_(OPEN_POSITION_STATUSES)
+                )
+            ).scalar()
             
             if open_positions >= RISK_MANAGEMENT["max_positions"]:
                 conditions["can_trade"] = False
@@ -103,66 +118,84 @@ class MarketScanner:
         
         return conditions
     
-    async def check_symbol_cooldown(self, symbol: str) -> bool:
+    def _reject(self, reason: str) -> None:
+        """Учитывает причину отсева пары (сводка — в конце scan_all)"""
+        self.reject_stats[reason] = self.reject_stats.get(reason, 0) + 1
+        return None
+    
+    async def get_daily_low(self, symbol: str, df) -> Optional[float]:
         """
-        Проверяет, можно ли отправить сигнал по паре.
-        Возвращает True если можно (кулдаун прошёл).
+        Лой текущих суток (UTC). Если загруженные 5m свечи начинаются не позже
+        полуночи — минимум их low с полуночи, без запроса; иначе дневная свеча.
         """
-        with get_db() as db:
-            cooldown = db.query(SignalCooldown).filter(
-                SignalCooldown.symbol == symbol
-            ).first()
-            
-            if not cooldown:
-                return True
-            
-            hours_since = (
-                datetime.now(timezone.utc) - cooldown.last_signal_at
-            ).total_seconds() / 3600
-            
-            return hours_since >= ANTI_FOMO["signal_cooldown_hours"]
+        ts = df['timestamp'].to_numpy()
+        midnight = ts[-1] - ts[-1] % DAY_MS
+        if ts[0] <= midnight:
+            return float(df['low'].to_numpy()[ts >= midnight].min())
+        ohlcv_1d = await self.exchange.get_ohlcv(symbol, "1440", limit=1)
+        return ohlcv_1d[-1][3] if ohlcv_1d else None
     
-    async def analyze_symbol(self, symbol: str) -> Optional[Dict]:
+    async def analyze_symbol(
+        self,
+        symbol: str,
+        ohlcv: Optional[List[List]] = None,
+        tickers: Optional[Dict[str, Dict]] = None,
+    ) -> Optional[Dict]:
         """
         Полный анализ одной пары.
+        ohlcv — заранее загруженные свечи основного ТФ (из get_ohlcv_many).
+        tickers — тикеры всех пар одного запроса (из get_tickers).
         Возвращает словарь с сигналом или None.
         """
         try:
-            # 1. Проверяем кулдаун
-            if not await self.check_symbol_cooldown(symbol):
-                return None
+            # 1. Кулдаун уже отсеян в scan_all (without_cooldown)
             
             # 2. Получаем свечи (основной ТФ - 5m)
-            ohlcv = await self.exchange.get_ohlcv(
-                symbol, 
-                TIMEFRAMES["main"],
-                limit=150
-            )
+            if ohlcv is None:
+                ohlcv = await self.exchange.get_ohlcv(
+                    symbol, 
+                    TIMEFRAMES["main"],
+                    limit=SCAN_OHLCV_LIMIT
+                )
             
             if not ohlcv or len(ohlcv) < 120:
-                return None
+                return self._reject("no_data")
             
             # 3. Рассчитываем индикаторы
-            df = calculate_indicators(ohlcv)
+            df = calculate_indicators(ohlcv, cache_key=symbol)
             if df is None:
-                return None
+                return self._reject("no_data")
             
             # 4. Проверяем фазу накопления
             is_accumulation, acc_metrics = detect_accumulation(df)
             if not is_accumulation:
-                return None  # Нет накопления - пропускаем
+                return self._reject("accumulation")  # Нет накопления - пропускаем
             
             # 5. Проверяем breakout
             is_breakout, br_metrics = detect_breakout(df)
             if not is_breakout:
-                return None  # Нет пробоя - пропускаем
+                return self._reject("breakout")  # Нет пробоя - пропускаем
             
-            # 6. Получаем данные для фильтров
-            ticker = await self.exchange.get_ticker(symbol)
+            # 6. Проверка FOMO (не покупать если +N% от лоя дня) — до запросов
+            # тикера и стакана; лой дня обычно берётся из уже загруженных свечей
+            daily_low = await self.get_daily_low(symbol, df)
+            if daily_low:
+                current_price = df.iloc[-1]['close']
+                from_low_pct = (current_price - daily_low) / daily_low
+                
+                if from_low_pct > ANTI_FOMO["max_from_daily_low_pct"]:
+                    logger.debug(f"{symbol}: +{from_low_pct*100:.1f}% от лоя дня - пропуск")
+                    return self._reject("fomo")
+            
+            # 7. Получаем данные для фильтров (только прошедшим все дешёвые проверки)
+            if tickers is not None:
+                ticker = tickers.get(symbol)
+            else:
+                ticker = await self.exchange.get_ticker(symbol)
             orderbook = await self.exchange.get_orderbook(symbol, limit=10)
             
             if not ticker or not orderbook:
-                return None
+                return self._reject("no_data")
             
             # Спред
             bid = orderbook['bids'][0][0] if orderbook['bids'] else 0
@@ -174,25 +207,13 @@ class MarketScanner:
             ask_volume = sum(a[1] for a in orderbook['asks'][:5])
             bid_ask_ratio = bid_volume / ask_volume if ask_volume > 0 else 0
             
-            # 7. Фильтр ложных пампов
+            # 8. Фильтр ложных пампов
             passed_filter, filter_metrics = check_false_pump_filter(
                 df, spread, bid_ask_ratio
             )
             
             if not passed_filter:
-                return None  # Не прошёл фильтр
-            
-            # 8. Проверка FOMO (не покупать если +10% от лоя дня)
-            # Получаем дневной low
-            ohlcv_1d = await self.exchange.get_ohlcv(symbol, "1440", limit=1)
-            if ohlcv_1d:
-                daily_low = ohlcv_1d[-1][3]  # low
-                current_price = df.iloc[-1]['close']
-                from_low_pct = (current_price - daily_low) / daily_low
-                
-                if from_low_pct > ANTI_FOMO["max_from_daily_low_pct"]:
-                    logger.debug(f"{symbol}: +{from_low_pct*100:.1f}% от лоя дня - пропуск")
-                    return None
+                return self._reject("false_pump")  # Не прошёл фильтр
             
             # 9. Рассчитываем уровни
             last = df.iloc[-1]
@@ -231,6 +252,29 @@ class MarketScanner:
             logger.error(f"Ошибка анализа {symbol}: {e}")
             return None
     
+    def prefilter_batch(self, ohlcv_map: Dict[str, List[List]]) -> Set[str]:
+        """
+        Отсев пачки одним векторным проходом: пары с полной историей
+        (SCAN_OHLCV_LIMIT свечей) проверяются на накопление и пробой сразу все,
+        дальше идут только прошедшие. Пары с другой длиной истории
+        не отсеиваются — их проверит analyze_symbol как раньше.
+        """
+        full = [
+            symbol for symbol, ohlcv in ohlcv_map.items()
+            if ohlcv and len(ohlcv) == SCAN_OHLCV_LIMIT
+        ]
+        candidates = set(ohlcv_map) - set(full)
+        if not full:
+            return candidates
+        
+        batch = np.empty((len(full), SCAN_OHLCV_LIMIT, 6), dtype=np.float64)
+        for i, symbol in enumerate(full):
+            batch[i] = ohlcv_matrix(ohlcv_map[symbol])
+        arrays = calculate_indicators_batch(batch)
+        mask = detect_accumulation_batch(arrays) & detect_breakout_batch(arrays)
+        candidates.update(full[i] for i in np.flatnonzero(mask))
+        return candidates
+    
     async def scan_all(self) -> List[Dict]:
         """
         Сканирует все пары и возвращает список сигналов.
@@ -253,29 +297,75 @@ class MarketScanner:
             logger.warning("Нет пар для сканирования")
             return []
         
-        signals = []
-        total = len(self.symbols)
+        self.reject_stats = {}
+        
+        # Пары на кулдауне отсеиваем до загрузки свечей — одной проверкой
+        symbols = await without_cooldown(self.symbols)
+        if len(symbols) < len(self.symbols):
+            self.reject_stats["cooldown"] = len(self.symbols) - len(symbols)
+        total = len(symbols)
+        
+        # Тикеры всех пар — один запрос на скан вместо запроса на пару
+        self._ticker_cache = await self.exchange.get_tickers()
+        tickers = self._ticker_cache or None
         
         logger.info(f"🔍 Начинаем сканирование {total} пар...")
         
-        # Сканируем с задержкой для rate limit
-        for i, symbol in enumerate(self.symbols):
+        # Пачки идут параллельно: свечи пачки — через семафор get_ohlcv_many,
+        # анализ кандидатов — не больше SCAN_MAX_CONCURRENCY пар одновременно.
+        # Темп запросов к Bybit держит встроенный rate limiter ccxt
+        sem = asyncio.Semaphore(SCAN_MAX_CONCURRENCY)
+        done = 0
+        
+        async def _analyze_limited(symbol: str, ohlcv: Optional[List[List]]):
+            async with sem:
+                return await self.analyze_symbol(symbol, ohlcv, tickers)
+        
+        async def _scan_batch(batch: List[str]) -> List[Dict]:
+            nonlocal done
+            # Между сканами меняются 1-2 последние свечи — дозагружаем хвост
+            ohlcv_map = await self.exchange.get_ohlcv_many(
+                batch, TIMEFRAMES["main"], limit=SCAN_OHLCV_LIMIT, incremental=True
+            )
             try:
-                signal = await self.analyze_symbol(symbol)
-                if signal:
-                    signals.append(signal)
-                    logger.info(f"🚀 Найден сигнал: {symbol}")
-                
-                # Rate limit: пауза каждые 10 пар + логирование прогресса
-                if (i + 1) % 10 == 0:
-                    logger.info(f"📊 Просканировано {i+1}/{total} пар...")
-                    await asyncio.sleep(1)
-                    
+                async with self._prefilter_lock:
+                    candidates = await asyncio.to_thread(self.prefilter_batch, ohlcv_map)
             except Exception as e:
-                logger.error(f"Ошибка сканирования {symbol}: {e}")
-                continue
+                logger.error(f"Ошибка пакетного отсева: {e}")
+                candidates = set(batch)
+            
+            symbols = [symbol for symbol in batch if symbol in candidates]
+            if len(symbols) < len(batch):
+                self.reject_stats["prefilter"] = (
+                    self.reject_stats.get("prefilter", 0) + len(batch) - len(symbols)
+                )
+            results = await asyncio.gather(
+                *(_analyze_limited(s, ohlcv_map.get(s)) for s in symbols),
+                return_exceptions=True,
+            )
+            found = []
+            for symbol, result in zip(symbols, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Ошибка сканирования {symbol}: {result}")
+                elif result:
+                    found.append(result)
+                    logger.info(f"🚀 Найден сигнал: {symbol}")
+            
+            done += len(batch)
+            logger.info(f"📊 Просканировано {done}/{total} пар...")
+            return found
+        
+        batches = [
+            symbols[start:start + SCAN_BATCH_SIZE]
+            for start in range(0, total, SCAN_BATCH_SIZE)
+        ]
+        signals = []
+        for found in await asyncio.gather(*(_scan_batch(b) for b in batches)):
+            signals.extend(found)
         
         logger.info(f"✅ Сканирование завершено. Сигналов: {len(signals)}")
+        if self.reject_stats:
+            logger.debug(f"Отсев по причинам: {self.reject_stats}")
         return signals
     
     async def save_signal_to_db(self, signal: Dict) -> int:
@@ -304,32 +394,23 @@ class MarketScanner:
             db.flush()
             signal_id = db_signal.id
             
-            # Обновляем кулдаун
+            # Обновляем кулдаун (в памяти для проверок, в БД — на случай перезапуска)
+            now = datetime.now(timezone.utc)
+            set_cooldown(signal["symbol"], now)
             cooldown = db.query(SignalCooldown).filter(
                 SignalCooldown.symbol == signal["symbol"]
             ).first()
             
             if cooldown:
-                cooldown.last_signal_at = datetime.now(timezone.utc)
+                cooldown.last_signal_at = now
             else:
                 cooldown = SignalCooldown(
                     symbol=signal["symbol"],
-                    last_signal_at=datetime.now(timezone.utc)
+                    last_signal_at=now
                 )
                 db.add(cooldown)
             
-            # Обновляем дневную статистику
-            today = datetime.now(timezone.utc).replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            stats = db.query(DailyStats).filter(
-                DailyStats.date == today
-            ).first()
-            
-            if stats:
-                stats.signals_sent += 1
-            else:
-                stats = DailyStats(date=today, signals_sent=1)
-                db.add(stats)
-            
-            return signal_id
+        # Обновляем дневную статистику (в памяти, в БД — отложенно)
+        daily_stats.increment("signals_sent")
+        
+        return signal_id
@@ -66,7 +66,7 @@ async def presignals_monitor_task(bot, exchange):
                 ohlcv = [[float(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5])] 
                          for c in reversed(candles["result"]["list"])]
                 
-                df = calculate_indicators(ohlcv)
+                df = calculate_indicators(ohlcv, cache_key=symbol)
                 if df is None or len(df) < 100:
                     continue
                 
@@ -15,7 +15,7 @@ from telegram.ext import (
 from src.config import TELEGRAM_CHAT_ID, RISK_MANAGEMENT, PRESIGNALS
 from src.database import (
     get_db, Signal, SignalStatus, Position, PositionStatus,
-    Trade, DailyStats, Holding
+    Trade, Holding, daily_stats
 )
 from src.trading.portfolio_sync import sync_holdings
 
@@ -145,14 +145,9 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pending_signals = db.query(Signal).filter(
             Signal.status == SignalStatus.PENDING
         ).count()
-        
-        # Сегодняшняя статистика
-        today = datetime.now(timezone.utc).replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        stats = db.query(DailyStats).filter(
-            DailyStats.date == today
-        ).first()
+    
+    # Сегодняшняя статистика
+    stats = daily_stats.snapshot()
     
     # BTC изменение
     btc_change = 0.0
@@ -171,10 +166,10 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
 <b>Ожидают решения:</b> {pending_signals}
 
 <b>Сегодня:</b>
-• Сигналов: {stats.signals_sent if stats else 0}
-• Принято: {stats.signals_accepted if stats else 0}
-• Стопов: {stats.stop_losses_today if stats else 0}
-• P&L: ${stats.total_pnl_usdt if stats else 0:+.2f}
+• Сигналов: {stats['signals_sent']}
+• Принято: {stats['signals_accepted']}
+• Стопов: {stats['stop_losses_today']}
+• P&L: ${stats['total_pnl_usdt']:+.2f}
 """
     
     await update.message.reply_text(text, parse_mode="HTML")
@@ -422,14 +417,11 @@ async def handle_buy_signal(query, signal_id: int, amount_usdt: Optional[float]
             signal.status = SignalStatus.ACCEPTED
             signal.decided_at = datetime.now(timezone.utc)
             
-            # Обновляем дневную статистику
-            today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-            stats = db.query(DailyStats).filter(DailyStats.date == today).first()
-            if stats:
-                stats.signals_accepted += 1
-            
             db.commit()
         
+        # Обновляем дневную статистику
+        daily_stats.increment("signals_accepted")
+        
         # 2. Сразу отвечаем пользователю
         await query.answer("✅ Принимаю сигнал, создаю ордер...", show_alert=False)
         
@@ -491,14 +483,11 @@ async def handle_skip_signal(query, signal_id: int):
             signal.status = SignalStatus.REJECTED
             signal.decided_at = datetime.now(timezone.utc)
             
-            # Обновляем статистику
-            today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-            stats = db.query(DailyStats).filter(DailyStats.date == today).first()
-            if stats:
-                stats.signals_rejected += 1
-            
             db.commit()
         
+        # Обновляем статистику
+        daily_stats.increment("signals_rejected")
+        
         # Быстрый ответ
         await query.answer("⏭ Сигнал пропущен", show_alert=False)
         
@@ -688,12 +677,9 @@ async def handle_status(query):
         pending_signals = db.query(Signal).filter(
             Signal.status == SignalStatus.PENDING
         ).count()
-        
-        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        stats = db.query(DailyStats).filter(DailyStats.date == today).first()
-        # Сохраняем значения до выхода из сессии, чтобы избежать DetachedInstanceError
-        stats_signals_sent = stats.signals_sent if stats else 0
-        stats_total_pnl_usdt = stats.total_pnl_usdt if stats else 0.0
+    
+    stats_signals_sent = daily_stats.get("signals_sent")
+    stats_total_pnl_usdt = daily_stats.get("total_pnl_usdt")
     
     btc_change = 0.0
     if exchange:
@@ -7,7 +7,7 @@ from loguru import logger
 
 from src.config import RISK_MANAGEMENT
 from src.database import (
-    get_db, Signal, SignalStatus, Position, PositionStatus, Trade
+    get_db, Signal, SignalStatus, Position, PositionStatus, Trade, daily_stats
 )
 from src.exchange import BybitExchange
 
@@ -284,22 +284,13 @@ class OrderExecutor:
                     PositionStatus.CLOSED_SL,
                     PositionStatus.CLOSED_MANUAL
                 ]:
-                    from src.database import DailyStats
-                    today = datetime.now(timezone.utc).replace(
-                        hour=0, minute=0, second=0, microsecond=0
-                    )
-                    stats = db.query(DailyStats).filter(
-                        DailyStats.date == today
-                    ).first()
-                    
-                    if stats:
-                        stats.total_pnl_usdt += position.total_pnl_usdt
-                        if position.total_pnl_usdt >= 0:
-                            stats.trades_won += 1
-                        else:
-                            stats.trades_lost += 1
-                            if position.status == PositionStatus.CLOSED_SL:
-                                stats.stop_losses_today += 1
+                    daily_stats.increment("total_pnl_usdt", position.total_pnl_usdt)
+                    if position.total_pnl_usdt >= 0:
+                        daily_stats.increment("trades_won")
+                    else:
+                        daily_stats.increment("trades_lost")
+                        if position.status == PositionStatus.CLOSED_SL:
+                            daily_stats.increment("stop_losses_today")
                 
                 db.flush()
                 trade_result = {